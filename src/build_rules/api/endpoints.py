@@ -1,6 +1,6 @@
 from django.urls import path
 
-from .views import RuleListCreateAPIView, RuleRetrieveUpdateDestroyAPIView, move
+from .views import RuleListCreateAPIView, RuleRetrieveUpdateDestroyAPIView, move, bulk_update
 
 
 app_name = 'build_rules'
@@ -10,6 +10,11 @@ urlpatterns = [
         view=RuleListCreateAPIView.as_view(),
         name='list'
     ),
+    path(
+        route='rules/bulk/',
+        view=bulk_update,
+        name='bulk'
+    ),
     path(
         route='rules/<int:rule_id>/',
         view=RuleRetrieveUpdateDestroyAPIView.as_view(),
@@ -4,12 +4,63 @@ from build_rules.models import Rule
 
 
 class RuleSerializer(serializers.ModelSerializer):
+    # Position of the rule, stored order values are sparse
+    order = serializers.IntegerField(source='position', min_value=1, required=False)
 
     class Meta:
         model = Rule
-        fields = ('id', 'title', 'description', 'order', 'command', 'timeout', 'continue_on_fail')
+        fields = ('id', 'title', 'description', 'order', 'command', 'timeout', 'continue_on_fail',
+                  'cacheable', 'cache_inputs', 'cache_outputs')
+
+    def validate(self, attrs):
+        cacheable = attrs.get('cacheable', getattr(self.instance, 'cacheable', False))
+        cache_outputs = attrs.get('cache_outputs', getattr(self.instance, 'cache_outputs', ''))
+        if cacheable and not cache_outputs.split():
+            raise serializers.ValidationError({'cache_outputs': "Outputs of a cacheable rule must be given"})
+        return attrs
 
     def create(self, validated_data):
+        # Rules are appended, as they always were
+        validated_data.pop('position', None)
         assignment = self.context.get('assignment', None)
         rule = Rule.objects.create(assignment=assignment, **validated_data)
+        rule.position = Rule.objects.position(rule)
         return rule
+
+    def update(self, instance, validated_data):
+        position = validated_data.pop('position', None)
+        instance = super().update(instance, validated_data)
+        if position is not None:
+            instance.position = Rule.objects.move(instance, position)
+        else:
+            instance.position = Rule.objects.position(instance)
+        return instance
+
+
+class RulePatchSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField()
+
+    class Meta:
+        model = Rule
+        fields = ('id', 'title', 'description', 'command', 'timeout', 'continue_on_fail',
+                  'cacheable', 'cache_inputs', 'cache_outputs')
+        extra_kwargs = {field: {'required': False} for field in fields if field != 'id'}
+
+
+class BulkRuleSerializer(serializers.Serializer):
+    """Complete ordered list of assignment's rules, each optionally carrying changed fields"""
+    rules = RulePatchSerializer(many=True)
+
+    def validate_rules(self, rules):
+        # Current values of the assignment's rules by id, patches are checked merged with them
+        current = self.context['rules']
+        ids = [rule['id'] for rule in rules]
+        if len(set(ids)) != len(ids) or set(ids) != set(current):
+            raise serializers.ValidationError("Every rule of the assignment must be listed exactly once")
+
+        for rule in rules:
+            cacheable = rule.get('cacheable', current[rule['id']]['cacheable'])
+            cache_outputs = rule.get('cache_outputs', current[rule['id']]['cache_outputs'])
+            if cacheable and not cache_outputs.split():
+                raise serializers.ValidationError(f"Outputs of a cacheable rule {rule['id']} must be given")
+        return rules
@@ -1,3 +1,4 @@
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 
 from rest_framework import generics, status
@@ -7,7 +8,7 @@ from rest_framework.decorators import api_view, permission_classes
 
 from courses.models import Assignment
 from courses.api.permissions import IsCourseStaff
-from build_rules.api.serializers import RuleSerializer
+from build_rules.api.serializers import RuleSerializer, BulkRuleSerializer
 from build_rules.models import Rule
 
 
@@ -21,7 +22,8 @@ class RuleListCreateAPIView(generics.ListCreateAPIView):
         assignment_id = self.kwargs['assignment_id']
         queryset = queryset.\
             filter(assignment__course__id=course_id, assignment__id=assignment_id).\
-            order_by('order')
+            with_positions().\
+            order_by('order', 'id')
         return queryset
 
     def create(self, request, pk=None, assignment_id=None):
@@ -48,6 +50,11 @@ class RuleRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
             filter(assignment__course__id=course_id, assignment__id=assignment_id)
         return queryset
 
+    def retrieve(self, request, *args, **kwargs):
+        rule = self.get_object()
+        rule.position = Rule.objects.position(rule)
+        return Response(self.get_serializer(rule).data)
+
 
 @api_view(['POST'])
 @permission_classes((IsAuthenticated, IsCourseStaff))
@@ -69,5 +76,24 @@ def move(request, pk, assignment_id, rule_id):
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    Rule.objects.move(obj, new_order)
+    new_order = Rule.objects.move(obj, new_order)
     return Response({'success': True, 'order': new_order})
+
+
+@api_view(['POST'])
+@permission_classes((IsAuthenticated, IsCourseStaff))
+def bulk_update(request, pk, assignment_id):
+    """Reorders rules of the assignment and changes their fields at once"""
+    rules = Rule.objects.filter(assignment__id=assignment_id, assignment__course__id=pk)
+
+    with transaction.atomic():
+        current = {rule['id']: rule for rule in
+                   rules.select_for_update().values('id', 'cacheable', 'cache_outputs')}
+        serializer = BulkRuleSerializer(data=request.data, context={'rules': current})
+        serializer.is_valid(raise_exception=True)
+
+        patches = [dict(rule) for rule in serializer.validated_data['rules']]
+        ids = [patch.pop('id') for patch in patches]
+        Rule.objects.rearrange(assignment_id, ids, {rule_id: patch for rule_id, patch in zip(ids, patches) if patch})
+
+    return Response(RuleSerializer(rules.with_positions().order_by('order', 'id'), many=True).data)
@@ -1,60 +1,128 @@
 from django.db import models, transaction
-from django.db.models import F, Max
-from django.core.validators import MinValueValidator
+from django.db.models import Case, When, Value, F, Max, Q, Window
+from django.db.models.functions import RowNumber
+from django.core.validators import MinValueValidator, RegexValidator
 
 from courses.models import Assignment
+from courses.utils.plans import invalidate_plans
+from build_rules.tasks import renumber_rules
 
+# Rules are stored with sparse order values, so a rule can be moved between any two
+# neighbours by updating its own row. Narrow gaps are respaced in background.
+ORDER_GAP = 1024
+RENUMBER_THRESHOLD = 16
 
-class RuleManager(models.Manager):
-    # @see: https://www.revsys.com/tidbits/keeping-django-model-objects-ordered/
 
-    def move(self, obj, new_order):
-        """ Move an object to a new order position """
-        qs = self.get_queryset()
+class RuleQuerySet(models.QuerySet):
 
-        with transaction.atomic():
-            if obj.order > int(new_order):
-                qs.filter(
-                    assignment=obj.assignment,
-                    order__lt=obj.order,
-                    order__gte=new_order
-                ).exclude(
-                    pk=obj.pk
-                ).update(
-                    order=F('order') + 1
-                )
+    def with_positions(self):
+        """Annotates rules with their 1-based positions among rules of their assignments"""
+        return self.annotate(position=Window(RowNumber(), partition_by=[F('assignment_id')],
+                                             order_by=[F('order').asc(), F('id').asc()]))
+
+
+class RuleManager(models.Manager.from_queryset(RuleQuerySet)):
+
+    def move(self, obj, position):
+        """
+        Moves rule to the given 1-based position among rules of its assignment and returns the
+        position. Only the moved rule is updated, provided its order value is unchanged since it
+        was read, so moves of other rules don't wait for each other. Rules which end up with equal
+        values are told apart by id. A position past the last rule is stored as the order value
+        itself when it's greater than the last one, as order values used to be stored.
+        """
+        requested = position = int(position)
+        while True:
+            siblings = self.filter(assignment_id=obj.assignment_id).exclude(pk=obj.pk).\
+                order_by('order', 'id').values_list('order', flat=True)
+
+            # Order values of rules which end up right before and right after the moved one
+            if position == 1:
+                before, after = 0, siblings.first()
             else:
-                qs.filter(
-                    assignment=obj.assignment,
-                    order__lte=new_order,
-                    order__gt=obj.order
-                ).exclude(
-                    pk=obj.pk
-                ).update(
-                    order=F('order') - 1
-                )
-
-            obj.order = new_order
-            obj.save()
+                neighbours = list(siblings[position - 2:position])
+                if not neighbours:
+                    before, after = siblings.last() or 0, None
+                    position = siblings.count() + 1
+                else:
+                    before, after = neighbours[0], (neighbours[1] if len(neighbours) > 1 else None)
+
+            if after is None:
+                order = requested if requested > before else before + ORDER_GAP
+            elif after - before > 1:
+                order = (before + after) // 2
+            else:
+                # Gap is exhausted before background respacing took place
+                self._move_respacing(obj, position)
+                break
+
+            if self.filter(pk=obj.pk, order=obj.order).update(order=order):
+                if after is not None and after - before < RENUMBER_THRESHOLD:
+                    transaction.on_commit(lambda: renumber_rules.delay(obj.assignment_id))
+                obj.order = order
+                break
+            # Rule was moved or respaced meanwhile
+            obj.order = self.filter(pk=obj.pk).values_list('order', flat=True).get()
+
+        # Updates don't send signals, so the execution plan is dropped here
+        invalidate_plans([obj.assignment_id])
+        return position
+
+    def _move_respacing(self, obj, position):
+        with transaction.atomic():
+            ids = list(self.filter(assignment_id=obj.assignment_id).select_for_update().
+                       order_by('order', 'id').values_list('id', flat=True))
+            ids.remove(obj.pk)
+            ids.insert(position - 1, obj.pk)
+            obj.order = self.rearrange(obj.assignment_id, ids)[obj.pk]
+
+    def position(self, obj):
+        """1-based position of the rule among rules of its assignment"""
+        return self.filter(
+            Q(order__lt=obj.order) | Q(order=obj.order, id__lt=obj.id),
+            assignment_id=obj.assignment_id
+        ).count() + 1
+
+    def renumber(self, assignment_id, ids=None):
+        """Respaces order values of assignment's rules in a single update, returns new values by rule id"""
+        if ids is None:
+            ids = list(self.filter(assignment_id=assignment_id).select_for_update().
+                       order_by('order', 'id').values_list('id', flat=True))
+        return self.rearrange(assignment_id, ids)
+
+    def rearrange(self, assignment_id, ids, patches=None):
+        """
+        Puts rules in the order of given ids and applies field patches by rule id
+        with a single update. Returns new order values by rule id.
+        """
+        orders = {rule_id: (index + 1) * ORDER_GAP for index, rule_id in enumerate(ids)}
+        if not orders:
+            return orders
+        invalidate_plans([assignment_id])
+
+        updates = {'order': [When(pk=rule_id, then=Value(order)) for rule_id, order in orders.items()]}
+        for rule_id, patch in (patches or {}).items():
+            for field, value in patch.items():
+                updates.setdefault(field, []).append(When(pk=rule_id, then=Value(value)))
+
+        self.filter(assignment_id=assignment_id, pk__in=ids).update(**{
+            field: Case(*cases, default=F(field), output_field=self.model._meta.get_field(field))
+            for field, cases in updates.items()
+        })
+        return orders
 
     def create(self, **kwargs):
         instance = self.model(**kwargs)
 
-        with transaction.atomic():
-            results = self.filter(
-                assignment=instance.assignment
-            ).aggregate(
-                Max('order')
-            )
+        # Rules are appended, concurrently created ones are told apart by id
+        current_order = self.filter(assignment=instance.assignment).aggregate(Max('order'))['order__max']
+        instance.order = (current_order or 0) + ORDER_GAP
+        instance.save()
+        return instance
 
-            current_order = results['order__max']
-            if current_order is None:
-                current_order = 0
 
-            value = current_order + 1
-            instance.order = value
-            instance.save()
-            return instance
+# Space separated paths relative to the sources directory, quoted nowhere in commands
+validate_paths = RegexValidator(r'^[\w./ -]*$', "Paths may contain only letters, digits, '_', '.', '/' and '-'")
 
 
 class Rule(models.Model):
@@ -65,11 +133,17 @@ class Rule(models.Model):
     timeout = models.PositiveIntegerField(null=True, blank=True, validators=[MinValueValidator(1)])
     continue_on_fail = models.BooleanField(default=True)
     assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, related_name='rules')
+    # Outputs of a cacheable rule are restored from the artifact cache instead
+    # of running it, when its inputs and the environment's image are unchanged
+    cacheable = models.BooleanField(default=False)
+    cache_inputs = models.CharField(max_length=255, default="", blank=True, validators=[validate_paths])
+    cache_outputs = models.CharField(max_length=255, default="", blank=True, validators=[validate_paths])
 
     objects = RuleManager()
 
     class Meta:
         index_together = ('assignment', 'order')
+        ordering = ('order', 'id')
 
     def __str__(self):
         return self.title
@@ -0,0 +1,11 @@
+from django.db import transaction
+
+from config.celery import app
+
+
+@app.task
+def renumber_rules(assignment_id):
+    from build_rules.models import Rule
+
+    with transaction.atomic():
+        Rule.objects.renumber(assignment_id)
@@ -101,6 +101,7 @@ class RuleListCreateAPIViewTest(RuleAPITestCase):
         response = self.client.get(self.list_create_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 5)
+        self.assertEqual([rule['order'] for rule in response.data], [1, 2, 3, 4, 5])
 
     def test_ta_can_get_a_list_of_rules(self):
         self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.ta_access_token}")
@@ -211,6 +212,15 @@ class RuleRetrieveUpdateDestroyAPIViewTest(RuleAPITestCase):
         self.assertEqual(rule.order, payload['order'])
         self.assertEqual(rule.command, payload['command'])
 
+    def test_cacheable_rule_requires_outputs(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.teacher_access_token}")
+        response = self.client.patch(self.detail_url, {'cacheable': True, 'cache_inputs': 'requirements.txt'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.patch(self.detail_url, {'cacheable': True, 'cache_outputs': 'venv build/lib'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(Rule.objects.get(id=self.rule.id).cacheable)
+
     def test_ta_cant_partially_update_a_rule(self):
         self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.ta_access_token}")
         response = self.client.patch(self.detail_url, payload={})
@@ -220,3 +230,68 @@ class RuleRetrieveUpdateDestroyAPIViewTest(RuleAPITestCase):
         self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.student_access_token}")
         response = self.client.patch(self.detail_url, payload={})
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class RuleBulkUpdateAPIViewTest(RuleAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.rules = [
+            self.assignment.add_rule(title=f'Rule {i}', description='', order=i, command='make', timeout=1,
+                                     continue_on_fail=True)
+            for i in range(3)
+        ]
+        self.bulk_url = reverse(
+            'courses:build_rules:bulk',
+            kwargs={
+                'pk': self.course.id,
+                'assignment_id': self.assignment.id
+            }
+        )
+
+    def test_teacher_can_reorder_and_update_rules(self):
+        first, second, third = self.rules
+        payload = {'rules': [{'id': third.id, 'command': 'make test', 'timeout': None}, {'id': first.id},
+                             {'id': second.id, 'title': 'Renamed'}]}
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.teacher_access_token}")
+        response = self.client.post(self.bulk_url, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(rule['id'], rule['order']) for rule in response.data],
+                         [(third.id, 1), (first.id, 2), (second.id, 3)])
+        self.assertEqual(list(self.assignment.rules.all()), [third, first, second])
+        third.refresh_from_db()
+        self.assertEqual((third.command, third.timeout, third.title), ('make test', None, 'Rule 2'))
+        self.assertEqual(Rule.objects.get(pk=second.id).title, 'Renamed')
+
+    def test_all_rules_must_be_listed(self):
+        payload = {'rules': [{'id': rule.id} for rule in self.rules[:2]]}
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.teacher_access_token}")
+        response = self.client.post(self.bulk_url, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(list(self.assignment.rules.all()), self.rules)
+
+    def test_cacheable_rules_require_outputs(self):
+        first, second, third = self.rules
+        Rule.objects.filter(pk=first.id).update(cache_outputs='build')
+        payload = {'rules': [{'id': first.id, 'cacheable': True}, {'id': second.id, 'cacheable': True},
+                             {'id': third.id}]}
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.teacher_access_token}")
+        response = self.client.post(self.bulk_url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Rule.objects.filter(cacheable=True).exists())
+
+        payload['rules'][1]['cache_outputs'] = 'venv'
+        response = self.client.post(self.bulk_url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(Rule.objects.filter(cacheable=True)), {first, second})
+
+    def test_ta_cant_update_rules(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.ta_access_token}")
+        response = self.client.post(self.bulk_url, {'rules': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
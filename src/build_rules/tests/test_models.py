@@ -1,7 +1,7 @@
 from django.test import TestCase
 
 from courses.models import Course, Environment
-from build_rules.models import Rule
+from build_rules.models import Rule, ORDER_GAP
 
 from courses.tests.test_models import SAMPLE_ENVIRONMENT
 
@@ -22,3 +22,46 @@ class TestRuleModel(TestCase):
     def test_string_representation(self):
         rule = Rule(title="Test rule", order=0, command="echo Hello, world!")
         self.assertEqual("Test rule", str(rule))
+
+    def _add_rules(self, count):
+        return [Rule.objects.create(title=f"Rule {i}", command="true", assignment=self.assignment)
+                for i in range(count)]
+
+    def test_rules_are_appended_with_gaps(self):
+        rules = self._add_rules(3)
+        self.assertEqual([rule.order for rule in rules], [ORDER_GAP, 2 * ORDER_GAP, 3 * ORDER_GAP])
+
+    def test_move_updates_single_rule(self):
+        first, second, third = self._add_rules(3)
+
+        with self.assertNumQueries(2):
+            # Neighbours and the update itself, nothing is locked besides the moved rule
+            position = Rule.objects.move(third, 1)
+
+        self.assertEqual(position, 1)
+        self.assertEqual(list(self.assignment.rules.all()), [third, first, second])
+        self.assertEqual(Rule.objects.get(pk=first.pk).order, ORDER_GAP)
+
+    def test_move_renumbers_exhausted_gap(self):
+        first, second, third = self._add_rules(3)
+        for _ in range(12):
+            Rule.objects.move(Rule.objects.get(pk=third.pk), 2)
+            Rule.objects.move(Rule.objects.get(pk=second.pk), 2)
+
+        self.assertEqual(list(self.assignment.rules.all()), [first, second, third])
+        self.assertEqual(Rule.objects.position(Rule.objects.get(pk=third.pk)), 3)
+
+    def test_move_retries_when_rule_was_moved_meanwhile(self):
+        first, second, third = self._add_rules(3)
+        stale = Rule.objects.get(pk=third.pk)
+        Rule.objects.move(Rule.objects.get(pk=third.pk), 1)
+
+        self.assertEqual(Rule.objects.move(stale, 2), 2)
+        self.assertEqual(list(self.assignment.rules.all()), [first, third, second])
+
+    def test_rules_with_equal_order_are_told_apart_by_id(self):
+        first, second, third = self._add_rules(3)
+        Rule.objects.filter(pk=third.pk).update(order=first.order)
+
+        rules = Rule.objects.filter(assignment=self.assignment).with_positions()
+        self.assertEqual([(rule, rule.position) for rule in rules], [(first, 1), (third, 2), (second, 3)])
@@ -63,8 +63,12 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # REST framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'courses.api.authentication.CourseRolesJWTAuthentication',
     ],
+    'DEFAULT_THROTTLE_RATES': {
+        'submissions_user': '10/min',
+        'submissions_course': '600/min',
+    },
 }
 
 # Password validation
@@ -110,6 +114,93 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Header for offloading file downloads to the front web server, e.g. 'X-Accel-Redirect'.
+# Files are then requested from SENDFILE_URL which must be mapped to MEDIA_ROOT.
+
+SENDFILE_HEADER = None
+
+SENDFILE_URL = '/protected-media/'
+
+# Uploaded files are hashed while streaming in to be stored by content
+
+FILE_UPLOAD_HANDLERS = [
+    'submissions.utils.uploadhandlers.HashingMemoryFileUploadHandler',
+    'submissions.utils.uploadhandlers.HashingTemporaryFileUploadHandler',
+]
+
+# Limits for uploaded source archives which are unpacked before grading
+
+SOURCES_ARCHIVE_MAX_SIZE = 100 * 1024 * 1024
+
+SOURCES_ARCHIVE_MAX_ENTRIES = 2000
+
+# Limit for sources uploaded in chunks through resumable upload sessions
+
+SUBMISSION_UPLOAD_MAX_SIZE = 512 * 1024 * 1024
+
+# Redis used for publishing status and output of running submissions to
+# event streams, events aren't published when it's not set. Seconds between
+# heartbeats of idle streams and before clients reconnect.
+
+SUBMISSION_EVENTS_URL = None
+
+SUBMISSION_EVENTS_HEARTBEAT = 15
+
+SUBMISSION_EVENTS_RETRY = 3
+
+# New submissions are answered with 429 while more tasks than SUBMISSION_QUEUE_MAX_DEPTH
+# are waiting in the broker, 0 turns the check off. Depth is read once in
+# SUBMISSION_QUEUE_CHECK_INTERVAL seconds, clients are asked to retry after
+# SUBMISSION_QUEUE_RETRY_AFTER seconds.
+
+SUBMISSION_QUEUE_MAX_DEPTH = 0
+
+SUBMISSION_QUEUE_CHECK_INTERVAL = 2
+
+SUBMISSION_QUEUE_RETRY_AFTER = 30
+
+# Seconds between checks whether a running submission was superseded by a newer one
+
+SUBMISSION_SUPERSEDED_CHECK_INTERVAL = 2
+
+# Local directory of each worker where outputs of cacheable rules are kept and the
+# total size of kept outputs in bytes, least recently used ones are evicted beyond it.
+# Zero disables the cache, so cacheable rules are always executed.
+
+ARTIFACT_CACHE_DIR = os.path.join(BASE_DIR, 'artifacts')
+
+ARTIFACT_CACHE_MAX_SIZE = 2 * 1024 * 1024 * 1024
+
+# Cache keeping hit and miss counters of the artifact cache, it has to be shared
+# by all workers so that `artifact_cache_stats` command can read them
+
+ARTIFACT_CACHE_STATS_CACHE = 'default'
+
+# Caches are shared by web and celery processes, so invalidation reaches all of them
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': config('CACHE_URL', default='redis://redis:6379/1'),
+    }
+}
+
+# Cache of users' roles in courses and seconds after which cached roles expire
+# even without invalidation. It has to be shared by all processes for invalidation
+# to reach them, local memory cache is reported by `courses.W001` check.
+
+MEMBERSHIP_CACHE = 'default'
+
+MEMBERSHIP_CACHE_TIMEOUT = 300
+
+# Cache of assignments' execution plans and seconds after which cached plans
+# expire. Plans are checked against the assignment's version before running,
+# so a cache which isn't shared costs rebuilds only
+
+EXECUTION_PLAN_CACHE = 'default'
+
+EXECUTION_PLAN_CACHE_TIMEOUT = 3600
+
 # Auth model
 
 AUTH_USER_MODEL = 'users.User'
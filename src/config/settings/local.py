@@ -17,4 +17,6 @@ DATABASES = {
 
 CELERY_BROKER_URL = config('CELERY_BROKER_URL')
 CELERY_RESULT_BACKEND = 'django-db'
+SUBMISSION_QUEUE_MAX_DEPTH = config('SUBMISSION_QUEUE_MAX_DEPTH', default=500, cast=int)
+SUBMISSION_EVENTS_URL = config('SUBMISSION_EVENTS_URL', default=CELERY_BROKER_URL)
 HOST_MEDIA_ROOT = config('HOST_MEDIA_ROOT')
\ No newline at end of file
@@ -24,3 +24,11 @@ TEST_RUNNER = 'config.test_runner.CeleryTestSuiteRunner'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media_test')
 HOST_MEDIA_ROOT = config('HOST_MEDIA_ROOT')
+
+# Tests run in a single process, so local memory cache is enough
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+SILENCED_SYSTEM_CHECKS = ['courses.W001']
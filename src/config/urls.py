@@ -19,11 +19,15 @@ from django.urls import include
 from django.views.generic import TemplateView
 from rest_framework_simplejwt import views as jwt_views
 
+from courses.api import tokens
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/users/', include('users.api.endpoints')),
     path('api/token/', jwt_views.TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', jwt_views.TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/token/roles/', tokens.CourseRolesTokenObtainPairView.as_view(), name='token_obtain_pair_roles'),
+    path('api/token/roles/refresh/', tokens.CourseRolesTokenRefreshView.as_view(), name='token_refresh_roles'),
     path('api/courses/', include('courses.api.endpoints')),
     path('api/submissions/', include('submissions.api.endpoints')),
     re_path(r'^.*', TemplateView.as_view(template_name='index.html')),
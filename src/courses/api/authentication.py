@@ -0,0 +1,48 @@
+from django.contrib.auth import get_user_model
+from django.utils.functional import SimpleLazyObject
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from courses.utils.roles import ROLES_CLAIM, get_membership_version
+
+User = get_user_model()
+
+
+class TokenLazyUser(SimpleLazyObject):
+    """User which is loaded from the database only when something besides its id is needed"""
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, user_id, membership_version):
+        def load():
+            user = User.objects.filter(pk=user_id).first()
+            if user is None or not user.is_active:
+                raise AuthenticationFailed("User not found or inactive", code='user_not_found')
+            return user
+
+        super().__init__(load)
+        self.__dict__['id'] = self.__dict__['pk'] = user_id
+        self.__dict__['membership_version'] = membership_version
+
+    def __bool__(self):
+        # Permission checks like `IsAuthenticated` test the user itself first
+        return True
+
+
+class CourseRolesJWTAuthentication(JWTAuthentication):
+    """
+    Authenticates like `JWTAuthentication`, but users of tokens with course roles
+    are loaded lazily, since permissions are resolved from the token itself.
+    Their activity is checked along with the version of their memberships.
+    """
+
+    def get_user(self, validated_token):
+        if ROLES_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        membership_version = get_membership_version(user_id)
+        if membership_version is None:
+            raise AuthenticationFailed("User not found or inactive", code='user_not_found')
+        return TokenLazyUser(user_id, membership_version)
@@ -22,11 +22,22 @@ urlpatterns = [
         name='detail'
     ),
 
+    path(
+        route='<int:pk>/clone/',
+        view=views.clone_course,
+        name='clone'
+    ),
+
     path(
         route='<int:pk>/members/',
         view=views.CourseMembersListManageView.as_view(),
         name='members-list'
     ),
+    path(
+        route='<int:pk>/members/bulk/',
+        view=views.enroll_members,
+        name='members-bulk'
+    ),
     path(
         route='<int:pk>/members/<int:user_id>/',
         view=views.CourseMembersRetrieveDestroyAPIView.as_view(),
@@ -68,4 +79,9 @@ urlpatterns = [
         view=views.manage_attachments,
         name='attachments-list',
     ),
+    path(
+        route='<int:pk>/attachments/<str:name>/',
+        view=views.download_attachment,
+        name='attachments-detail',
+    ),
 ]
@@ -1,6 +1,7 @@
 from rest_framework import permissions
 
-from courses.models import Course, Membership
+from courses.models import Membership
+from courses.utils.roles import get_course_role
 
 
 class IsCourseStaff(permissions.BasePermission):
@@ -8,14 +9,7 @@ class IsCourseStaff(permissions.BasePermission):
     def has_permission(self, request, view):
         # NOTE: The teacher can perform all CRUD operations while the TA
         # can only perform read operations.
-        # TODO: One additional query to the DB. Is there any better way?
-        course_id = view.kwargs['pk']
-        course_member = Membership.objects.\
-            filter(course__id=course_id, user=request.user).\
-            first()
-        if not course_member:
-            return False
-        course_role = course_member.role
+        course_role = get_course_role(request, view.kwargs['pk'])
         if course_role == Membership.TEACHER:
             return True
         elif course_role == Membership.TA and request.method in permissions.SAFE_METHODS:
@@ -28,9 +22,7 @@ class RoleBasedPermission(permissions.BasePermission):
     ROLE = None
 
     def has_permission(self, request, view):
-        course_id = view.kwargs['pk']
-        course = Course.objects.get(pk=course_id)
-        return self.ROLE == course.get_role(request.user)
+        return self.ROLE == get_course_role(request, view.kwargs['pk'])
 
 
 class IsTeacher(RoleBasedPermission):
@@ -48,11 +40,7 @@ class IsStudent(RoleBasedPermission):
 class IsMember(permissions.BasePermission):
 
     def has_permission(self, request, view):
-        course_id = view.kwargs['pk']
-        user_id = request.user.id
-        course = Course.objects.get(pk=course_id)
-
-        return course.has_member(user_id)
+        return get_course_role(request, view.kwargs['pk']) is not None
 
 
 class IsRequester(permissions.BasePermission):
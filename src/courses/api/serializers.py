@@ -22,6 +22,31 @@ class CourseMembersSerializer(serializers.ModelSerializer):
         return course.add_member(user, role)
 
 
+class RoleField(serializers.ChoiceField):
+    """Accepts role by its value as well as by name, e.g. 2 or 'student'"""
+    ROLE_NAMES = {'teacher': Membership.TEACHER, 'ta': Membership.TA, 'student': Membership.STUDENT}
+
+    def __init__(self, **kwargs):
+        super().__init__(choices=Membership.ROLES_CHOICES, **kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) and data.strip().lower() in self.ROLE_NAMES:
+            return self.ROLE_NAMES[data.strip().lower()]
+        return super().to_internal_value(data)
+
+
+class CourseCloneSerializer(serializers.Serializer):
+    title = serializers.CharField(max_length=100, required=False)
+
+
+class BulkMemberSerializer(serializers.Serializer):
+    email = serializers.EmailField()
+    role = RoleField()
+
+    def validate_email(self, value):
+        return User.objects.normalize_email(value)
+
+
 class CourseSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -66,11 +91,12 @@ class AssignmentSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Assignment
-        fields = ('id', 'environment', 'course_id', 'title', 'description')
+        fields = ('id', 'environment', 'course_id', 'title', 'description', 'cancel_superseded')
 
     def update(self, instance, validated_data):
         instance.title = validated_data.get('title', instance.title)
         instance.description = validated_data.get('description', instance.description)
+        instance.cancel_superseded = validated_data.get('cancel_superseded', instance.cancel_superseded)
         instance.save()
         return instance
 
@@ -0,0 +1,47 @@
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework_simplejwt.views import TokenViewBase
+
+from courses.models import Membership
+from courses.utils.roles import ROLES_CLAIM, VERSION_CLAIM, get_membership_version
+
+
+def add_course_roles(token, user_id):
+    """Embeds map of course id to the user's role and version of memberships it's valid for"""
+    # Version is read first, so a change in between makes the token outdated rather than wrong
+    token[VERSION_CLAIM] = get_membership_version(user_id)
+    token[ROLES_CLAIM] = {
+        str(course_id): role
+        for course_id, role in Membership.objects.filter(user__id=user_id).values_list('course_id', 'role')
+    }
+    return token
+
+
+class CourseRolesTokenObtainPairSerializer(TokenObtainPairSerializer):
+
+    @classmethod
+    def get_token(cls, user):
+        return add_course_roles(super().get_token(user), user.id)
+
+
+class CourseRolesTokenRefreshSerializer(TokenRefreshSerializer):
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        # Roles copied from the refresh token may be outdated, so they are embedded anew
+        access = AccessToken(data['access'])
+        data['access'] = str(add_course_roles(access, access[api_settings.USER_ID_CLAIM]))
+        return data
+
+
+class CourseRolesTokenObtainPairView(TokenViewBase):
+    """
+    Returns token pair like `TokenObtainPairView`, access tokens also carry
+    the user's course roles, so permissions are checked without the database.
+    """
+    serializer_class = CourseRolesTokenObtainPairSerializer
+
+
+class CourseRolesTokenRefreshView(TokenViewBase):
+    serializer_class = CourseRolesTokenRefreshSerializer
@@ -1,3 +1,7 @@
+import io
+import os
+import csv
+
 from rest_framework import views, status, generics
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
@@ -7,15 +11,19 @@ from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
 from django.core.exceptions import ObjectDoesNotExist
 from django.db.utils import IntegrityError
+from django.utils.http import parse_etags
 
 from courses.api.serializers import CourseSerializer, CourseMembersSerializer, AssignmentSerializer,\
-    EnvironmentSerializer, CourseCreationRequestSerializer
+    EnvironmentSerializer, CourseCreationRequestSerializer, BulkMemberSerializer, CourseCloneSerializer
 from courses.models import Course, Assignment, Membership, Environment, CourseCreationRequest
 from courses.api.permissions import IsTeacher, IsTA, IsStudent, IsMember, IsCourseStaff, IsRequester
-from courses.utils.attachments import list_attachments, upload_attachments
+from courses.utils.attachments import get_manifest, upload_attachments, get_attachments_path
+from courses.utils.responses import file_response
 
 User = get_user_model()
 
+BULK_ENROLLMENT_MAX_ROWS = 5000
+
 
 class BaseManageView(views.APIView):
     def dispatch(self, request, *args, **kwargs):
@@ -72,6 +80,22 @@ class CourseDetailManageView(BaseManageView):
     }
 
 
+@api_view(['POST'])
+@permission_classes((IsAuthenticated, IsTeacher))
+def clone_course(request, pk):
+    """Creates a course for a new term out of this one, the requester becomes its teacher"""
+    course = get_object_or_404(Course, pk=pk)
+    serializer = CourseCloneSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+
+    try:
+        clone = course.clone(request.user, title=serializer.validated_data.get('title', None))
+    except OSError:
+        return Response({'error': "Attachments of the course can't be copied"},
+                        status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return Response(CourseSerializer(clone).data, status=status.HTTP_201_CREATED)
+
+
 class CourseCreationRequestCreateView(views.APIView):
     queryset = CourseCreationRequest.objects.all()
     serializer_class = CourseCreationRequestSerializer
@@ -130,6 +154,63 @@ class CourseMembersCreateView(views.APIView):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+def _read_members_csv(text):
+    rows = [row for row in csv.reader(io.StringIO(text)) if row]
+    if rows and rows[0][0].strip().lower() == 'email':
+        rows = rows[1:]
+    return [{'email': row[0].strip(), 'role': row[1].strip() if len(row) > 1 else ''} for row in rows]
+
+
+@api_view(['POST'])
+@permission_classes((IsAuthenticated, IsTeacher | IsTA))
+def enroll_members(request, pk):
+    """
+    Enrolls users listed as JSON array of {email, role} objects, or as CSV with
+    `email,role` rows sent in the body or as `file`. Returns status of every row.
+    """
+    course = get_object_or_404(Course, pk=pk)
+
+    try:
+        if request.content_type.startswith('text/csv'):
+            rows = _read_members_csv(request.body.decode('utf-8-sig'))
+        elif 'file' in request.FILES:
+            rows = _read_members_csv(request.FILES['file'].read().decode('utf-8-sig'))
+        else:
+            rows = request.data
+    except UnicodeDecodeError:
+        return Response({'error': 'CSV must be encoded in UTF-8'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if not isinstance(rows, list):
+        return Response({'error': 'List of members is expected'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(rows) > BULK_ENROLLMENT_MAX_ROWS:
+        return Response({'error': f'At most {BULK_ENROLLMENT_MAX_ROWS} members can be enrolled at once'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    row_serializers = [BulkMemberSerializer(data=row) for row in rows]
+    roles_by_email = {
+        serializer.validated_data['email']: serializer.validated_data['role']
+        for serializer in row_serializers if serializer.is_valid()
+    }
+    enrollment = course.add_members(roles_by_email)
+    enrolled, unknown = set(enrollment['enrolled']), set(enrollment['unknown'])
+
+    results = []
+    for row, serializer in zip(rows, row_serializers):
+        if serializer.errors:
+            results.append({'row': row, 'status': 'invalid', 'errors': serializer.errors})
+            continue
+        email = serializer.validated_data['email']
+        if email in unknown:
+            row_status = 'unknown_user'
+        elif email in enrolled:
+            row_status = 'already_enrolled'
+        else:
+            row_status = 'created'
+        results.append({'email': email, 'role': serializer.validated_data['role'], 'status': row_status})
+
+    return Response({'created': len(enrollment['created']), 'results': results})
+
+
 class CourseMembersListView(generics.ListAPIView):
     queryset = Membership.objects.all()
     serializer_class = CourseMembersSerializer
@@ -300,7 +381,28 @@ class EnvironmentListManageView(BaseManageView):
 def manage_attachments(request, pk):
     if request.method == 'POST':
         attachments = request.FILES.getlist('attachments', [])
-        upload_attachments(pk, attachments)
+        manifest = upload_attachments(pk, attachments)
+    else:
+        manifest = get_manifest(pk)
+
+    etag = f'"{manifest["version"]}"'
+    if request.method == 'GET' and etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+    data = {
+        'attachments': [entry['name'] for entry in manifest['files']],
+        'version': manifest['version'],
+        'files': manifest['files'],
+    }
+    return Response(data, headers={'ETag': etag})
+
+
+@api_view(['GET'])
+@permission_classes((IsAuthenticated, IsMember))
+def download_attachment(request, pk, name):
+    entry = next((entry for entry in get_manifest(pk)['files'] if entry['name'] == name), None)
+    if entry is None:
+        return Response(status=status.HTTP_404_NOT_FOUND)
 
-    attachments = list_attachments(pk)
-    return Response({'attachments': attachments})
+    path = os.path.join(get_attachments_path(pk), entry['name'])
+    return file_response(request, path, etag=f'"{entry["sha256"]}"')
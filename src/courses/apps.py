@@ -1,5 +1,29 @@
 from django.apps import AppConfig
+from django.contrib.auth import get_user_model
+from django.core import checks
+from django.db.models.signals import post_save, post_delete
 
 
 class CoursesConfig(AppConfig):
     name = 'courses'
+
+    def ready(self):
+        from courses.checks import check_shared_caches
+        from courses.models import Membership, Assignment, Environment
+        from build_rules.models import Rule
+        from courses.signals import (
+            invalidate_membership, invalidate_user_activity, invalidate_assignment_plan, invalidate_rule_plan,
+            invalidate_environment_plans
+        )
+
+        checks.register(check_shared_caches, checks.Tags.caches)
+
+        post_save.connect(invalidate_membership, sender=Membership, dispatch_uid='courses_membership_saved')
+        post_delete.connect(invalidate_membership, sender=Membership, dispatch_uid='courses_membership_deleted')
+        post_save.connect(invalidate_user_activity, sender=get_user_model(), dispatch_uid='courses_user_saved')
+
+        # Execution plans of assignments, see courses.utils.plans
+        for model, handler in ((Assignment, invalidate_assignment_plan), (Rule, invalidate_rule_plan),
+                               (Environment, invalidate_environment_plans)):
+            post_save.connect(handler, sender=model, dispatch_uid=f'courses_{model.__name__.lower()}_plan_saved')
+            post_delete.connect(handler, sender=model, dispatch_uid=f'courses_{model.__name__.lower()}_plan_deleted')
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.checks import Warning
+
+PROCESS_LOCAL_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+def check_shared_caches(app_configs, **kwargs):
+    """Invalidation of cached roles reaches other web and celery processes only through a shared cache"""
+    if settings.CACHES[settings.MEMBERSHIP_CACHE]['BACKEND'] != PROCESS_LOCAL_BACKEND:
+        return []
+
+    return [Warning(
+        "MEMBERSHIP_CACHE is local to each process, so membership changes aren't seen by other processes",
+        hint="Configure a shared cache backend, e.g. django_redis.cache.RedisCache",
+        id='courses.W001',
+    )]
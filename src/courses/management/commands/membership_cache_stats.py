@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from courses.utils.roles import get_cache_stats, reset_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Shows hit ratio of the course roles cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Reset counters after showing them")
+
+    def handle(self, *args, **options):
+        stats = get_cache_stats()
+        ratio = 'n/a' if stats['hit_ratio'] is None else f"{stats['hit_ratio']:.2%}"
+        self.stdout.write(f"Hits: {stats['hits']}, misses: {stats['misses']}, hit ratio: {ratio}")
+
+        if options['reset']:
+            reset_cache_stats()
@@ -1,8 +1,12 @@
-from django.db import models
+import re
+import uuid
+import hashlib
+
+from django.db import models, transaction
+from django.db.utils import IntegrityError
 from django.contrib.auth import get_user_model
-from django.core.exceptions import ObjectDoesNotExist
 
-from courses.tasks import create_docker_image, update_docker_image, delete_docker_image
+from courses.tasks import create_docker_image, update_docker_image, delete_docker_image, tag_docker_image
 
 User = get_user_model()
 
@@ -19,25 +23,112 @@ class Course(models.Model):
     def add_member(self, user, role):
         return Membership.objects.create(user=user, course=self, role=role)
 
+    def add_members(self, roles_by_email):
+        """
+        Enrolls users given by emails with their roles in a few queries regardless of their count.
+        Returns dictionary with ids of enrolled users and emails which are unknown or enrolled already.
+        """
+        from courses.utils.roles import invalidate_memberships
+
+        user_ids = dict(User.objects.filter(email__in=roles_by_email).values_list('email', 'id'))
+
+        # Memberships created concurrently make the insert fail, they are skipped on the second attempt
+        for attempt in range(2):
+            try:
+                with transaction.atomic():
+                    enrolled_ids = set(Membership.objects.
+                                       filter(course=self, user__id__in=user_ids.values()).
+                                       values_list('user_id', flat=True))
+                    memberships = [
+                        Membership(course=self, user_id=user_id, role=roles_by_email[email])
+                        for email, user_id in user_ids.items() if user_id not in enrolled_ids
+                    ]
+                    Membership.objects.bulk_create(memberships)
+                break
+            except IntegrityError:
+                if attempt:
+                    raise
+
+        # Signals aren't sent by bulk_create, so cached roles are dropped here
+        created_ids = [membership.user_id for membership in memberships]
+        invalidate_memberships(self.id, created_ids)
+
+        return {
+            'created': created_ids,
+            'enrolled': [email for email, user_id in user_ids.items() if user_id in enrolled_ids],
+            'unknown': [email for email in roles_by_email if email not in user_ids],
+        }
+
+    def clone(self, teacher, title=None):
+        """
+        Copies environments, assignments with their rules and attachments into a new course
+        with bulk inserts. Built images are tagged for new environments instead of rebuilding.
+        Raises OSError when attachments can't be linked, the course isn't created then.
+        """
+        from build_rules.models import Rule
+        from courses.utils.attachments import clone_attachments
+
+        environments = list(self.environments.all())
+        assignments = list(self.assignments.all())
+        rules = list(Rule.objects.filter(assignment__course=self))
+
+        with transaction.atomic():
+            course = Course.objects.create(title=title or self.title, description=self.description)
+            course.add_member(teacher, Membership.TEACHER)
+
+            # Saving environments one by one would build their images, so they are inserted in bulk
+            new_environments = Environment.objects.bulk_create([
+                Environment(course=course, title=environment.title, dockerfile_content=environment.dockerfile_content,
+                            tag=environment.tag_for_course(course.id), status=Environment.PROCESSING)
+                for environment in environments
+            ])
+            environment_ids = {old.id: new.id for old, new in zip(environments, new_environments)}
+
+            new_assignments = Assignment.objects.bulk_create([
+                Assignment(course=course, environment_id=environment_ids[assignment.environment_id],
+                           title=assignment.title, description=assignment.description,
+                           cancel_superseded=assignment.cancel_superseded)
+                for assignment in assignments
+            ])
+            assignment_ids = {old.id: new.id for old, new in zip(assignments, new_assignments)}
+
+            Rule.objects.bulk_create([
+                Rule(assignment_id=assignment_ids[rule.assignment_id], title=rule.title, description=rule.description,
+                     order=rule.order, command=rule.command, timeout=rule.timeout,
+                     continue_on_fail=rule.continue_on_fail, cacheable=rule.cacheable,
+                     cache_inputs=rule.cache_inputs, cache_outputs=rule.cache_outputs)
+                for rule in rules
+            ])
+
+            for old, new in zip(environments, new_environments):
+                if old.status == Environment.CREATED:
+                    transaction.on_commit(lambda tag=old.tag, pk=new.id: tag_docker_image.delay(tag, pk))
+                else:
+                    transaction.on_commit(lambda pk=new.id: create_docker_image.delay(pk))
+
+            # Failed linking rolls the course back, images aren't built for it then
+            clone_attachments(self.id, course.id)
+        return course
+
     def remove_member(self, user_id):
         Membership.objects.get(user__id=user_id).delete()
 
     def has_member(self, user_id):
-        return Membership.objects.filter(user__id=user_id).exists()
+        from courses.utils.roles import get_cached_role
 
-    def add_assignment(self, title, description, environment):
-        return Assignment.objects.create(course=self, title=title, description=description, environment=environment)
+        return get_cached_role(self.id, user_id) is not None
+
+    def add_assignment(self, title, description, environment, cancel_superseded=False):
+        return Assignment.objects.create(course=self, title=title, description=description, environment=environment,
+                                         cancel_superseded=cancel_superseded)
 
     def remove_assignment(self, assignment_id):
         Assignment.objects.get(pk=assignment_id).delete()
 
     def get_role(self, user):
-        try:
-            entry = Membership.objects.filter(course=self, user=user).get()
-        except ObjectDoesNotExist:
-            return None
+        from courses.utils.roles import get_cached_role
 
-        return entry.role
+        return get_cached_role(self.id, user.id)
 
     def __str__(self):
         return self.title
@@ -111,6 +202,16 @@ class Environment(models.Model):
         if pk is None:
             create_docker_image.delay(self.id)
 
+    def tag_for_course(self, course_id):
+        """Tag of this environment's copy in another course, clones of clones don't grow it"""
+        suffix = f'-course{course_id}'
+        base = re.sub(r'-course\d+$', '', self.tag)
+        max_length = self._meta.get_field('tag').max_length - len(suffix)
+        if len(base) > max_length:
+            # Shortened tags stay unique by a hash of the whole one
+            base = f"{base[:max_length - 9]}-{hashlib.sha1(base.encode()).hexdigest()[:8]}"
+        return f'{base}{suffix}'
+
     def delete(self, *args, **kwargs):
         delete_docker_image.delay(self.tag)
         super().delete(*args, **kwargs)
@@ -127,6 +228,10 @@ class Assignment(models.Model):
     environment = models.ForeignKey(Environment, on_delete=models.CASCADE)
     title = models.CharField(max_length=100)
     description = models.TextField()
+    # Unfinished submissions are cancelled when the same user submits again
+    cancel_superseded = models.BooleanField(default=False)
+    # Changed whenever its execution plan is invalidated, so plans cached by any process can be checked
+    plan_version = models.UUIDField(default=uuid.uuid4, editable=False)
 
     def add_rule(self, title, description, order, command, timeout, continue_on_fail):
         from build_rules.models import Rule
@@ -0,0 +1,29 @@
+from courses.utils.roles import invalidate_role, bump_membership_version, invalidate_membership_versions
+from courses.utils.plans import invalidate_plans
+
+
+def invalidate_membership(sender, instance, **kwargs):
+    # Deleting a course deletes its memberships one by one, so it's covered as well
+    invalidate_role(instance.course_id, instance.user_id)
+    # Tokens with course roles of the user become outdated
+    bump_membership_version(instance.user_id)
+
+
+def invalidate_user_activity(sender, instance, update_fields=None, **kwargs):
+    # Tokens with course roles are accepted only while the user is active
+    if update_fields is None or 'is_active' in update_fields:
+        invalidate_membership_versions([instance.id])
+
+
+def invalidate_assignment_plan(sender, instance, **kwargs):
+    invalidate_plans([instance.id])
+
+
+def invalidate_rule_plan(sender, instance, **kwargs):
+    invalidate_plans([instance.assignment_id])
+
+
+def invalidate_environment_plans(sender, instance, **kwargs):
+    from courses.models import Assignment
+
+    invalidate_plans(Assignment.objects.filter(environment_id=instance.id).values_list('id', flat=True))
@@ -29,3 +29,18 @@ def delete_docker_image(tag):
 def update_docker_image(tag, environment_id):
     delete_docker_image(tag)
     create_docker_image(environment_id)
+
+
+@app.task
+def tag_docker_image(source_tag, environment_id):
+    """Reuses image of another environment with the same Dockerfile instead of building it"""
+    from courses.models import Environment
+
+    process = subprocess.run(['docker', 'tag', source_tag, Environment.objects.get(pk=environment_id).tag],
+                             capture_output=True)
+    if process.returncode != 0:
+        # Source image is gone, so it's built from scratch
+        create_docker_image(environment_id)
+        return
+
+    Environment.objects.filter(pk=environment_id).update(status=Environment.CREATED)
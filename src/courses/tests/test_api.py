@@ -1,7 +1,13 @@
+import os
 import json
+import shutil
+import hashlib
+import tarfile
 from time import sleep
 
+from django.conf import settings
 from django.urls import reverse
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
 from django.db import transaction
 from django.db.utils import IntegrityError
@@ -11,6 +17,7 @@ from rest_framework_simplejwt.tokens import AccessToken
 
 from courses.models import Course, Membership, Assignment, Environment, CourseCreationRequest
 from courses.tasks import delete_docker_image
+from courses.utils.attachments import get_course_path, get_bundle_media_path
 
 User = get_user_model()
 
@@ -683,3 +690,232 @@ class EnvironmentAPIViewTest(APITestCase):
         response = self.client.patch(self.environment_detail_url, {})
 
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class AttachmentsAPIViewTest(APITestCase):
+
+    def setUp(self):
+        self.teacher = User.objects.create(email="teacher@mail.com")
+        self.student = User.objects.create(email="student@mail.com")
+
+        self.course = Course.objects.create(**SAMPLE_COURSE)
+        self.course.add_member(self.teacher, Membership.TEACHER)
+        self.course.add_member(self.student, Membership.STUDENT)
+
+        self.teacher_access_token = AccessToken.for_user(self.teacher)
+        self.student_access_token = AccessToken.for_user(self.student)
+
+        self.attachments_url = reverse('courses:attachments-list', args=(self.course.id,))
+
+    def tearDown(self):
+        shutil.rmtree(get_course_path(self.course.id), ignore_errors=True)
+
+    def _upload(self, name, content):
+        return self.client.post(self.attachments_url, {'attachments': [SimpleUploadedFile(name, content)]})
+
+    def test_teacher_can_upload_attachments(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.teacher_access_token}")
+        response = self._upload('test.py', b'assert True')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['attachments'], ['test.py'])
+        self.assertEqual(response.data['files'][0]['sha256'], hashlib.sha256(b'assert True').hexdigest())
+
+        bundle_path = os.path.join(settings.MEDIA_ROOT, get_bundle_media_path(self.course.id, response.data['version']))
+        with tarfile.open(bundle_path) as tf:
+            self.assertEqual(tf.getnames(), ['test.py'])
+
+    def test_upload_changes_version(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.teacher_access_token}")
+        first_version = self._upload('test.py', b'assert True').data['version']
+        second_version = self._upload('test.py', b'assert False').data['version']
+
+        self.assertNotEqual(first_version, second_version)
+
+    def test_unchanged_attachments_are_not_modified(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.teacher_access_token}")
+        self._upload('test.py', b'assert True')
+
+        response = self.client.get(self.attachments_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(self.attachments_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_student_cant_upload_attachments(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.student_access_token}")
+        response = self._upload('test.py', b'assert True')
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_member_can_download_attachment(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.teacher_access_token}")
+        self._upload('test.py', b'assert True')
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.student_access_token}")
+        response = self.client.get(reverse('courses:attachments-detail', args=(self.course.id, 'test.py')))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), b'assert True')
+        self.assertEqual(response['ETag'], f'"{hashlib.sha256(b"assert True").hexdigest()}"')
+
+    def test_can_download_range_of_attachment(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.teacher_access_token}")
+        self._upload('test.py', b'assert True')
+
+        url = reverse('courses:attachments-detail', args=(self.course.id, 'test.py'))
+        response = self.client.get(url, HTTP_RANGE='bytes=7-')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response['Content-Range'], 'bytes 7-10/11')
+        self.assertEqual(b''.join(response.streaming_content), b'True')
+
+        response = self.client.get(url, HTTP_RANGE='bytes=20-')
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+
+    def test_unchanged_attachment_is_not_downloaded_again(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.teacher_access_token}")
+        self._upload('test.py', b'assert True')
+
+        url = reverse('courses:attachments-detail', args=(self.course.id, 'test.py'))
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_cant_download_missing_attachment(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.teacher_access_token}")
+        response = self.client.get(reverse('courses:attachments-detail', args=(self.course.id, 'missing.py')))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_non_member_cant_download_attachment(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.teacher_access_token}")
+        self._upload('test.py', b'assert True')
+
+        user = User.objects.create(email="stranger@mail.com")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+        response = self.client.get(reverse('courses:attachments-detail', args=(self.course.id, 'test.py')))
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class BulkEnrollmentAPIViewTest(APITestCase):
+
+    def setUp(self):
+        self.teacher = User.objects.create_user("teacher@mail.com")
+        self.enrolled = User.objects.create_user("enrolled@mail.com")
+        self.students = [User.objects.create_user(f"student{i}@mail.com") for i in range(3)]
+        self.course = Course.objects.create(title="Test course", description="Test course description")
+        self.course.add_member(self.teacher, Membership.TEACHER)
+        self.course.add_member(self.enrolled, Membership.STUDENT)
+        self.url = reverse('courses:members-bulk', args=(self.course.id,))
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.teacher)}")
+
+    def test_can_enroll_members_from_json(self):
+        payload = [
+            {'email': 'student0@mail.com', 'role': Membership.STUDENT},
+            {'email': 'student1@mail.com', 'role': 'ta'},
+            {'email': 'enrolled@mail.com', 'role': Membership.STUDENT},
+            {'email': 'unknown@mail.com', 'role': Membership.STUDENT},
+            {'email': 'not an email', 'role': Membership.STUDENT},
+        ]
+        response = self.client.post(self.url, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([row['status'] for row in response.data['results']],
+                         ['created', 'created', 'already_enrolled', 'unknown_user', 'invalid'])
+        self.assertEqual(self.course.get_role(self.students[1]), Membership.TA)
+
+    def test_can_enroll_members_from_csv(self):
+        content = "email,role\nstudent0@mail.com,student\nstudent1@mail.com,2\nstudent2@mail.com,student\n"
+        csv_file = SimpleUploadedFile('members.csv', content.encode(), content_type='text/csv')
+        response = self.client.post(self.url, {'file': csv_file}, format='multipart')
+
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual(Membership.objects.filter(course=self.course).count(), 5)
+
+    def test_enrollment_takes_constant_number_of_queries(self):
+        users = [User.objects.create_user(f"bulk{i}@mail.com") for i in range(50)]
+
+        with self.assertNumQueries(6):
+            # Users, enrolled members, insert and version bump, plus the savepoint pair
+            self.course.add_members({user.email: Membership.STUDENT for user in users})
+
+    def test_students_cant_enroll_members(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.enrolled)}")
+        response = self.client.post(self.url, [], format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class CourseCloneAPIViewTest(APITestCase):
+
+    def setUp(self):
+        from courses.tests.test_models import SAMPLE_ENVIRONMENT
+
+        self.teacher = User.objects.create(email="teacher@mail.com")
+        self.student = User.objects.create(email="student@mail.com")
+
+        self.course = Course.objects.create(**SAMPLE_COURSE)
+        self.course.add_member(self.teacher, Membership.TEACHER)
+        self.course.add_member(self.student, Membership.STUDENT)
+        self.environment = Environment.objects.create(course=self.course, **SAMPLE_ENVIRONMENT)
+        self.assignment = self.course.add_assignment(title='Test assignment', environment=self.environment,
+                                                     description='Test assignment description')
+        self.assignment.add_rule(title='Build', description='', order=1, command='make', timeout=10,
+                                 continue_on_fail=False)
+        self.url = reverse('courses:clone', args=(self.course.id,))
+
+    def tearDown(self):
+        for course in Course.objects.all():
+            shutil.rmtree(get_course_path(course.id), ignore_errors=True)
+
+    def test_teacher_can_clone_course(self):
+        from courses.utils.attachments import upload_attachments, get_attachments_path
+
+        upload_attachments(self.course.id, [SimpleUploadedFile('test.py', b'assert True')])
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.teacher)}")
+        response = self.client.post(self.url, {'title': 'Next term'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        clone = Course.objects.get(pk=response.data['id'])
+        self.assertEqual(clone.title, 'Next term')
+        self.assertEqual(clone.get_role(self.teacher), Membership.TEACHER)
+        self.assertFalse(clone.has_member(self.student.id))
+
+        environment = clone.environments.get()
+        self.assertNotEqual(environment.tag, self.environment.tag)
+        assignment = clone.assignments.get()
+        self.assertEqual(assignment.environment, environment)
+        self.assertEqual(list(assignment.rules.values_list('command', flat=True)), ['make'])
+
+        source = os.stat(os.path.join(get_attachments_path(self.course.id), 'test.py'))
+        linked = os.stat(os.path.join(get_attachments_path(clone.id), 'test.py'))
+        self.assertEqual(source.st_ino, linked.st_ino)
+
+    def test_course_isnt_cloned_when_attachments_cant_be_linked(self):
+        from courses.utils.attachments import upload_attachments, get_attachments_path
+
+        upload_attachments(self.course.id, [SimpleUploadedFile('test.py', b'assert True')])
+        os.remove(os.path.join(get_attachments_path(self.course.id), 'test.py'))
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.teacher)}")
+        response = self.client.post(self.url, {}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(list(Course.objects.all()), [self.course])
+        self.assertEqual([name for name in os.listdir(os.path.dirname(get_course_path(self.course.id)))
+                          if name.endswith('.cloning')], [])
+
+    def test_title_is_validated(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.teacher)}")
+        response = self.client.post(self.url, {'title': 'x' * 101}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('title', response.data)
+
+    def test_student_cant_clone_course(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.student)}")
+        response = self.client.post(self.url, {}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(Course.objects.count(), 1)
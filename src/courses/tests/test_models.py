@@ -1,11 +1,12 @@
 from time import sleep
 
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ObjectDoesNotExist
 
 from courses.models import Course, Assignment, Membership, Environment
 from courses.tasks import delete_docker_image
+from courses.utils.plans import get_plan, _cache, _plan_key
 from build_rules.models import Rule
 
 User = get_user_model()
@@ -186,3 +187,75 @@ class TestEnvironmentModel(TestCase):
         updated_env = Environment.objects.get(pk=env.id)
         self.assertEqual(updated_env.status, Environment.CREATED)
         delete_docker_image(test_environment['tag'])
+
+
+class TestEnvironmentTags(TestCase):
+
+    def test_tags_of_cloned_environments_dont_grow(self):
+        environment = Environment(tag='python-course12')
+        self.assertEqual(environment.tag_for_course(34), 'python-course34')
+
+        environment.tag = 'x' * 100
+        tag = environment.tag_for_course(34)
+        self.assertEqual(len(tag), 100)
+        self.assertNotEqual(tag, Environment(tag='x' * 99 + 'y').tag_for_course(34))
+
+
+class TestExecutionPlan(TestCase):
+
+    def setUp(self):
+        self.course = Course.objects.create(title="Test course", description="Test course description")
+        self.environment = Environment.objects.create(course=self.course, **SAMPLE_ENVIRONMENT)
+        self.assignment = self.course.add_assignment(title="Test assignment", environment=self.environment,
+                                                     description="Test assignment description")
+        self.rule = self.assignment.add_rule(title="Build", description="", order=1, command="make", timeout=10,
+                                             continue_on_fail=False)
+
+    def test_cached_plan_costs_no_queries(self):
+        plan = get_plan(self.assignment.id)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_plan(self.assignment.id), plan)
+        self.assertEqual(plan.image, SAMPLE_ENVIRONMENT['tag'])
+        self.assertEqual([step.command for step in plan.steps], ["'timeout 10 make'"])
+
+    def test_plan_is_rebuilt_after_changes(self):
+        get_plan(self.assignment.id)
+        second = self.assignment.add_rule(title="Test", description="", order=2, command="make test", timeout=None,
+                                          continue_on_fail=True)
+        self.assertEqual([step.command for step in get_plan(self.assignment.id).steps],
+                         ["'timeout 10 make'", "' make test'"])
+
+        Rule.objects.move(second, 1)
+        self.assertEqual([step.command for step in get_plan(self.assignment.id).steps],
+                         ["' make test'", "'timeout 10 make'"])
+
+        self.environment.tag = "other_image"
+        self.environment.save()
+        self.assertEqual(get_plan(self.assignment.id).image, "other_image")
+
+
+class TestExecutionPlanVersion(TransactionTestCase):
+    # Plan version is bumped once changes are committed
+
+    def setUp(self):
+        self.course = Course.objects.create(title="Test course", description="Test course description")
+        self.environment = Environment.objects.create(course=self.course, **SAMPLE_ENVIRONMENT)
+        self.assignment = self.course.add_assignment(title="Test assignment", environment=self.environment,
+                                                     description="Test assignment description")
+        self.rule = self.assignment.add_rule(title="Build", description="", order=1, command="make", timeout=10,
+                                             continue_on_fail=False)
+
+    def test_plan_cached_by_other_process_is_rebuilt(self):
+        stale_plan = get_plan(self.assignment.id)
+        self.rule.command = "make all"
+        self.rule.save()
+        # Invalidation didn't reach the cache of the process running the submission
+        _cache().set(_plan_key(self.assignment.id), stale_plan)
+
+        assignment = Assignment.objects.get(pk=self.assignment.id)
+        plan = get_plan(assignment.id, assignment.plan_version)
+        self.assertEqual([step.command for step in plan.steps], ["'timeout 10 make all'"])
+        self.assertEqual(plan.plan_version, assignment.plan_version)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_plan(assignment.id, assignment.plan_version), plan)
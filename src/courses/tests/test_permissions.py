@@ -0,0 +1,239 @@
+import io
+import shutil
+import tempfile
+
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from django.contrib.auth import get_user_model
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from courses.models import Course, Membership
+from courses.api.permissions import IsTeacher, IsTA, IsMember, IsCourseStaff
+from courses.checks import check_shared_caches
+from courses.utils.roles import get_cached_role, get_cache_stats, reset_cache_stats, _role_key
+
+User = get_user_model()
+
+
+class View:
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+
+class TestCourseRolePermissions(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user('teacher@mail.com')
+        self.student = User.objects.create_user('student@mail.com')
+        self.course = Course.objects.create(title="Test course", description="Test course description")
+        self.course.add_member(self.teacher, Membership.TEACHER)
+        self.course.add_member(self.student, Membership.STUDENT)
+        self.view = View(pk=self.course.id)
+        self.http_request = APIRequestFactory().get('/')
+
+    def _request(self, user):
+        request = Request(self.http_request)
+        request.user, request.auth = user, None
+        return request
+
+    def test_role_is_resolved_once_per_request(self):
+        request = self._request(self.student)
+
+        with self.assertNumQueries(1):
+            self.assertFalse((IsTeacher | IsTA)().has_permission(request, self.view))
+            self.assertTrue(IsMember().has_permission(request, self.view))
+            self.assertFalse(IsCourseStaff().has_permission(request, self.view))
+
+    def test_role_is_shared_by_requests_of_sub_views(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(IsTeacher().has_permission(self._request(self.teacher), self.view))
+            self.assertTrue(IsCourseStaff().has_permission(self._request(self.teacher), self.view))
+
+    def test_non_members_have_no_role(self):
+        stranger = User.objects.create_user('stranger@mail.com')
+        request = self._request(stranger)
+
+        with self.assertNumQueries(1):
+            self.assertFalse(IsMember().has_permission(request, self.view))
+            self.assertFalse((IsTeacher | IsTA)().has_permission(request, self.view))
+
+
+class TestMembershipCache(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user('student@mail.com')
+        self.course = Course.objects.create(title="Test course", description="Test course description")
+        self.membership = self.course.add_member(self.student, Membership.STUDENT)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_roles_are_shared_between_requests(self):
+        self.assertEqual(get_cached_role(self.course.id, self.student.id), Membership.STUDENT)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.course.get_role(self.student), Membership.STUDENT)
+            self.assertTrue(self.course.has_member(self.student.id))
+
+    def test_non_members_are_cached_too(self):
+        stranger = User.objects.create_user('stranger@mail.com')
+        self.assertFalse(self.course.has_member(stranger.id))
+
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.course.get_role(stranger))
+
+    def test_role_change_invalidates_cache(self):
+        get_cached_role(self.course.id, self.student.id)
+
+        self.membership.role = Membership.TA
+        self.membership.save()
+
+        self.assertEqual(get_cached_role(self.course.id, self.student.id), Membership.TA)
+
+    def test_membership_removal_invalidates_cache(self):
+        get_cached_role(self.course.id, self.student.id)
+
+        self.membership.delete()
+
+        self.assertIsNone(get_cached_role(self.course.id, self.student.id))
+
+    def test_course_deletion_invalidates_cache(self):
+        course_id = self.course.id
+        get_cached_role(course_id, self.student.id)
+
+        self.course.delete()
+
+        self.assertIsNone(get_cached_role(course_id, self.student.id))
+
+    def test_counts_hits_and_misses(self):
+        reset_cache_stats()
+        for _ in range(4):
+            get_cached_role(self.course.id, self.student.id)
+
+        # Counts are kept by the process until they are flushed
+        self.assertIsNone(cache.get('course_role_stats:hits'))
+
+        self.assertEqual(get_cache_stats(), {'hits': 3, 'misses': 1, 'hit_ratio': 0.75})
+        out = io.StringIO()
+        call_command('membership_cache_stats', reset=True, stdout=out)
+        self.assertIn("75.00%", out.getvalue())
+        self.assertEqual(get_cache_stats()['hits'], 0)
+
+    def test_warns_about_process_local_cache(self):
+        self.assertEqual([warning.id for warning in check_shared_caches(None)], ['courses.W001'])
+
+        with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+            self.assertEqual(check_shared_caches(None), [])
+
+
+class TestMembershipCacheInvalidation(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user('student@mail.com')
+        self.course = Course.objects.create(title="Test course", description="Test course description")
+        self.membership = self.course.add_member(self.student, Membership.STUDENT)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_role_cached_before_commit_is_dropped(self):
+        with transaction.atomic():
+            self.membership.delete()
+            # Concurrent request reads the membership which isn't deleted yet for it
+            cache.set(_role_key(self.course.id, self.student.id), Membership.STUDENT)
+
+        self.assertIsNone(get_cached_role(self.course.id, self.student.id))
+
+
+class TestCourseRolesTokens(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user('student@mail.com', password='password')
+        self.course = Course.objects.create(title="Test course", description="Test course description")
+        self.membership = self.course.add_member(self.student, Membership.STUDENT)
+        self.url = reverse('courses:assignments-list', args=(self.course.id,))
+
+    def tearDown(self):
+        cache.clear()
+
+    def _obtain_token(self):
+        response = self.client.post(reverse('token_obtain_pair_roles'),
+                                    {'email': 'student@mail.com', 'password': 'password'})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        return response.data
+
+    def test_token_carries_course_roles(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        token = AccessToken(self._obtain_token()['access'])
+
+        self.assertEqual(token['course_roles'], {str(self.course.id): Membership.STUDENT})
+
+    def test_permissions_are_checked_without_database(self):
+        cache_dir = tempfile.mkdtemp()
+        shared_cache = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                    'LOCATION': cache_dir}}
+        with self.settings(CACHES=shared_cache):
+            self._obtain_token()
+            self.client.get(self.url)
+
+            with self.assertNumQueries(1):
+                # Only the assignments themselves
+                response = self.client.get(self.url)
+        shutil.rmtree(cache_dir)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_outdated_token_isnt_trusted_with_process_local_cache(self):
+        from courses.utils.roles import get_membership_version
+
+        self._obtain_token()
+        version = get_membership_version(self.student.id)
+        self.membership.delete()
+        # Another process changed the membership, so this process' cache wasn't invalidated
+        cache.set(f'membership_version:{self.student.id}', version)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_token_of_deactivated_user_isnt_accepted(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        shared_cache = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                    'LOCATION': cache_dir}}
+        with self.settings(CACHES=shared_cache):
+            self._obtain_token()
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+            self.student.is_active = False
+            self.student.save()
+
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_outdated_token_isnt_trusted(self):
+        self._obtain_token()
+        self.membership.delete()
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_refreshed_token_carries_actual_roles(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        refresh = self._obtain_token()['refresh']
+        self.membership.role = Membership.TA
+        self.membership.save()
+
+        response = self.client.post(reverse('token_refresh_roles'), {'refresh': refresh})
+        token = AccessToken(response.data['access'])
+        self.assertEqual(token['course_roles'], {str(self.course.id): Membership.TA})
@@ -1,25 +1,217 @@
 import os
+import json
+import uuid
+import fcntl
+import shutil
+import hashlib
+import tarfile
+from contextlib import contextmanager
 
 from django.conf import settings
 
+CHUNK_SIZE = 64 * 1024
+
+# Manifests are cached in-process and revalidated by manifest's inode and mtime
+_manifests = {}
+
+
+def get_course_path(course_id):
+    return os.path.join(settings.MEDIA_ROOT, 'courses', f'course_{course_id}')
+
 
 def get_attachments_path(course_id):
-    path = os.path.join(settings.MEDIA_ROOT, 'courses', f'course_{course_id}', 'attachments')
-    if not os.path.isdir(path):
-        os.makedirs(path)
-    return path
+    return os.path.join(get_course_path(course_id), 'attachments')
+
+
+def get_manifest_path(course_id):
+    return os.path.join(get_course_path(course_id), 'attachments.json')
+
+
+def get_bundle_media_path(course_id, version):
+    """Location within MEDIA_ROOT directory of a tar bundle with attachments of given version."""
+    return os.path.join('courses', f'course_{course_id}', 'bundles', f'{version}.tar')
+
+
+def get_manifest(course_id):
+    """
+    Returns attachments manifest of the course: its version and name, size
+    and sha256 of every file. Costs a single `stat` call when cached.
+    """
+    manifest = _read_manifest(course_id)
+    if manifest is not None:
+        return manifest
+
+    # Attachments uploaded before manifests were introduced
+    if os.path.isdir(get_attachments_path(course_id)):
+        return rebuild_manifest(course_id)
+
+    return _make_manifest([])
 
 
 def list_attachments(course_id):
-    path = get_attachments_path(course_id)
-    entries = os.listdir(path)
-    return entries
+    return [entry['name'] for entry in get_manifest(course_id)['files']]
 
 
 def upload_attachments(course_id, attachments):
     path = get_attachments_path(course_id)
-    for file in attachments:
-        file_path = os.path.join(path, file.name)
-        with open(file_path, 'wb+') as destination:
-            for chunk in file.chunks():
-                destination.write(chunk)
+    os.makedirs(path, exist_ok=True)
+
+    with _manifest_lock(course_id):
+        manifest = _read_manifest(course_id)
+        entries = manifest['files'] if manifest is not None else _scan_attachments(course_id)
+        entries = {entry['name']: entry for entry in entries}
+
+        for file in attachments:
+            name = os.path.basename(file.name)
+            file_path = os.path.join(path, name)
+            tmp_path = os.path.join(path, f'.{name}.uploading')
+
+            hasher = hashlib.sha256()
+            with open(tmp_path, 'wb') as destination:
+                for chunk in file.chunks():
+                    destination.write(chunk)
+                    hasher.update(chunk)
+            # Replacing keeps files linked elsewhere untouched
+            os.replace(tmp_path, file_path)
+
+            entries[name] = {'name': name, 'size': file.size, 'sha256': hasher.hexdigest()}
+
+        return _publish(course_id, entries.values())
+
+
+def clone_attachments(source_course_id, target_course_id):
+    """
+    Hard links attachments and the bundle of one course into another one, which has no
+    files yet. Uploads replace files instead of rewriting them, so linked files stay
+    independent. Files are linked into a temporary directory which is renamed into place,
+    so a failure raises OSError and leaves nothing behind.
+    """
+    if not get_manifest(source_course_id)['files']:
+        return _make_manifest([])
+
+    course_path = get_course_path(target_course_id)
+    tmp_path = f'{course_path}.{uuid.uuid4().hex}.cloning'
+
+    def staged(path):
+        return os.path.join(tmp_path, os.path.relpath(path, course_path))
+
+    try:
+        with _manifest_lock(source_course_id):
+            manifest = _read_manifest(source_course_id)
+            if manifest is None or not manifest['files']:
+                return _make_manifest([])
+
+            source_path = get_attachments_path(source_course_id)
+            target_path = staged(get_attachments_path(target_course_id))
+            os.makedirs(target_path)
+            for entry in manifest['files']:
+                os.link(os.path.join(source_path, entry['name']), os.path.join(target_path, entry['name']))
+
+            # Version depends on files only, so the bundle is the same as well
+            version = manifest['version']
+            source_bundle = os.path.join(settings.MEDIA_ROOT, get_bundle_media_path(source_course_id, version))
+            target_bundle = staged(os.path.join(settings.MEDIA_ROOT, get_bundle_media_path(target_course_id, version)))
+            os.makedirs(os.path.dirname(target_bundle))
+            os.link(source_bundle, target_bundle)
+
+        with open(staged(get_manifest_path(target_course_id)), 'w') as f:
+            json.dump(manifest, f)
+        os.rename(tmp_path, course_path)
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    return manifest
+
+
+def rebuild_manifest(course_id):
+    """Builds manifest and bundle out of files presented in attachments directory"""
+    with _manifest_lock(course_id):
+        return _publish(course_id, _scan_attachments(course_id))
+
+
+def _read_manifest(course_id):
+    path = get_manifest_path(course_id)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    key = (stat.st_ino, stat.st_mtime_ns)
+    cached = _manifests.get(course_id)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    with open(path) as f:
+        manifest = json.load(f)
+    _manifests[course_id] = (key, manifest)
+    return manifest
+
+
+def _scan_attachments(course_id):
+    path = get_attachments_path(course_id)
+    if not os.path.isdir(path):
+        return []
+
+    entries = []
+    for name in os.listdir(path):
+        file_path = os.path.join(path, name)
+        if name.startswith('.') or not os.path.isfile(file_path):
+            continue
+        entries.append({'name': name, 'size': os.path.getsize(file_path), 'sha256': _hash_file(file_path)})
+    return entries
+
+
+def _make_manifest(entries):
+    files = sorted(entries, key=lambda entry: entry['name'])
+    version = hashlib.sha256(json.dumps(files, sort_keys=True).encode()).hexdigest()
+    return {'version': version, 'files': files}
+
+
+def _publish(course_id, entries):
+    """Builds bundle for the new version and then atomically replaces the manifest"""
+    manifest = _make_manifest(entries)
+    bundle_path = os.path.join(settings.MEDIA_ROOT, get_bundle_media_path(course_id, manifest['version']))
+    bundles_dir = os.path.dirname(bundle_path)
+    os.makedirs(bundles_dir, exist_ok=True)
+
+    if not os.path.isfile(bundle_path):
+        tmp_path = f'{bundle_path}.building'
+        with tarfile.open(tmp_path, 'w') as tf:
+            for entry in manifest['files']:
+                tf.add(os.path.join(get_attachments_path(course_id), entry['name']), arcname=entry['name'])
+        os.replace(tmp_path, bundle_path)
+
+    _write_manifest(course_id, manifest)
+
+    # Running containers keep their mounted bundles even after unlinking
+    for name in os.listdir(bundles_dir):
+        if os.path.join(bundles_dir, name) != bundle_path:
+            os.remove(os.path.join(bundles_dir, name))
+
+    return manifest
+
+
+def _write_manifest(course_id, manifest):
+    manifest_path = get_manifest_path(course_id)
+    tmp_path = f'{manifest_path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+
+
+@contextmanager
+def _manifest_lock(course_id):
+    os.makedirs(get_course_path(course_id), exist_ok=True)
+    with open(os.path.join(get_course_path(course_id), '.attachments.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _hash_file(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
@@ -0,0 +1,95 @@
+import os
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from courses.utils.attachments import get_manifest, get_bundle_media_path
+
+# Bumped whenever the plan layout changes, so plans cached by older code aren't used
+PLAN_FORMAT = 3
+
+ExecutionPlan = namedtuple('ExecutionPlan', (
+    'assignment_id', 'course_id', 'plan_version', 'image', 'attachments_version', 'volumes', 'steps',
+    'cancel_superseded'
+))
+Step = namedtuple('Step', ('command', 'continue_on_fail', 'cache'))
+CacheSpec = namedtuple('CacheSpec', ('inputs', 'outputs'))
+
+
+def _cache():
+    return caches[settings.EXECUTION_PLAN_CACHE]
+
+
+def _plan_key(assignment_id):
+    return f'execution_plan:{PLAN_FORMAT}:{assignment_id}'
+
+
+def get_plan(assignment_id, plan_version=None):
+    """
+    Returns execution plan of the assignment: image, teacher's attachments mounts and
+    compiled commands of its rules. Cached plans cost no queries, they are dropped when
+    the assignment, its environment or rules change and rebuilt for new attachments.
+    Given the assignment's current `plan_version`, plans left in caches which weren't
+    reached by invalidation are rebuilt as well.
+    """
+    plan = _cache().get(_plan_key(assignment_id))
+    if plan is not None and plan.attachments_version == get_manifest(plan.course_id)['version'] and \
+            plan_version in (None, plan.plan_version):
+        return plan
+
+    plan = build_plan(assignment_id)
+    _cache().set(_plan_key(assignment_id), plan, settings.EXECUTION_PLAN_CACHE_TIMEOUT)
+    return plan
+
+
+def build_plan(assignment_id):
+    from courses.models import Assignment
+
+    assignment = Assignment.objects.select_related('environment').get(pk=assignment_id)
+    steps = tuple(Step(_compile(rule), rule.continue_on_fail, _cache_spec(rule)) for rule in assignment.rules.all())
+
+    # Teacher's attachments are mounted as a single prebuilt bundle of the current version
+    manifest = get_manifest(assignment.course_id)
+    volumes = ()
+    if manifest['files']:
+        bundle_path = os.path.join(settings.HOST_MEDIA_ROOT,
+                                   get_bundle_media_path(assignment.course_id, manifest['version']))
+        volumes = (f'--volume={bundle_path}:/teacher-attachments.tar:ro',)
+
+    return ExecutionPlan(assignment_id=assignment.id, course_id=assignment.course_id,
+                         plan_version=assignment.plan_version, image=assignment.environment.tag,
+                         attachments_version=manifest['version'], volumes=volumes, steps=steps,
+                         cancel_superseded=assignment.cancel_superseded)
+
+
+def invalidate_plans(assignment_ids):
+    from courses.models import Assignment
+
+    assignment_ids = list(assignment_ids)
+    keys = [_plan_key(assignment_id) for assignment_id in assignment_ids]
+    _cache().delete_many(keys)
+
+    def invalidate():
+        # Version is read before the rules by `build_plan`, so plans built before it changes
+        # are outdated. It changes after the commit, so edits don't hold assignments locked.
+        Assignment.objects.filter(id__in=assignment_ids).update(plan_version=uuid.uuid4())
+        # Plans rebuilt by concurrent runs before the commit would keep old values
+        _cache().delete_many(keys)
+
+    transaction.on_commit(invalidate)
+
+
+def _compile(rule):
+    """Argument of `bash -c` executing the rule"""
+    timeout = f"timeout {rule.timeout}" if rule.timeout else ''
+    return f"'{timeout} {rule.command}'"
+
+
+def _cache_spec(rule):
+    outputs = tuple(rule.cache_outputs.split())
+    if not rule.cacheable or not outputs:
+        return None
+    return CacheSpec(inputs=tuple(rule.cache_inputs.split()), outputs=outputs)
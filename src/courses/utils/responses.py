@@ -0,0 +1,129 @@
+import os
+import re
+import mimetypes
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import http_date, parse_etags
+from django.views.static import was_modified_since
+
+CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header, size):
+    """
+    Returns (start, end) of a single byte range, None if the whole content
+    should be served, or False if the range can't be satisfied.
+    """
+    match = RANGE_RE.match(header or '')
+    if match is None:
+        # Multiple ranges aren't supported, the whole content is served instead
+        return None
+
+    start, end = match.groups()
+    if start == '' and end == '':
+        return None
+
+    if start == '':
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, min(end, size - 1)
+
+
+def content_disposition(filename):
+    try:
+        filename.encode('ascii')
+        return f'attachment; filename="{filename}"'
+    except UnicodeEncodeError:
+        return f"attachment; filename*=utf-8''{quote(filename)}"
+
+
+def ranged_response(request, fileobj, size, content_type=None, etag=None, last_modified=None, filename=None):
+    """
+    Serves file-like object honoring conditional and Range requests.
+    The whole file is served by FileResponse, so the server may use `sendfile`.
+    """
+    if etag is not None:
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            fileobj.close()
+            return HttpResponseNotModified()
+    if last_modified is not None and 'HTTP_IF_NONE_MATCH' not in request.META:
+        if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), last_modified):
+            fileobj.close()
+            return HttpResponseNotModified()
+
+    byte_range = None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range is None or if_range == etag:
+        byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+
+    content_type = content_type or 'application/octet-stream'
+
+    if byte_range is False:
+        fileobj.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif byte_range is None:
+        response = FileResponse(fileobj, content_type=content_type)
+        response['Content-Length'] = size
+    else:
+        start, end = byte_range
+        fileobj.seek(start)
+        response = StreamingHttpResponse(_read_range(fileobj, end - start + 1),
+                                         status=206, content_type=content_type)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    response['Accept-Ranges'] = 'bytes'
+    if etag is not None:
+        response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    if filename is not None:
+        response['Content-Disposition'] = content_disposition(filename)
+    return response
+
+
+def file_response(request, path, etag=None, filename=None):
+    """
+    Serves file within MEDIA_ROOT. When SENDFILE_HEADER is configured the file
+    is handed over to the front web server (e.g. X-Accel-Redirect for nginx).
+    """
+    filename = filename or os.path.basename(path)
+    content_type = mimetypes.guess_type(filename)[0]
+
+    if settings.SENDFILE_HEADER:
+        response = HttpResponse(content_type=content_type)
+        relative_path = os.path.relpath(path, settings.MEDIA_ROOT)
+        response[settings.SENDFILE_HEADER] = settings.SENDFILE_URL + quote(relative_path)
+        response['Content-Disposition'] = content_disposition(filename)
+        if etag is not None:
+            response['ETag'] = etag
+        return response
+
+    fileobj = open(path, 'rb')
+    stat = os.fstat(fileobj.fileno())
+    return ranged_response(request, fileobj, stat.st_size, content_type=content_type, etag=etag,
+                           last_modified=stat.st_mtime, filename=filename)
+
+
+def _read_range(fileobj, length):
+    try:
+        while length > 0:
+            chunk = fileobj.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        fileobj.close()
@@ -0,0 +1,189 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+
+from courses.checks import PROCESS_LOCAL_BACKEND
+
+# Cached for users who aren't members, so their requests don't reach the database either
+NO_ROLE = -1
+# Cached instead of membership version of users who are inactive or don't exist
+INACTIVE = -1
+
+# Claims of access tokens carrying course roles of the user, see courses.api.tokens
+ROLES_CLAIM = 'course_roles'
+VERSION_CLAIM = 'membership_version'
+
+STATS_KEYS = ('hits', 'misses')
+# Counts of a process are shared after this many lookups or seconds since the last flush
+STATS_FLUSH_SIZE = 100
+STATS_FLUSH_INTERVAL = 60
+
+_pending_stats = {'hits': 0, 'misses': 0, 'since': time.monotonic()}
+
+
+def _cache():
+    return caches[settings.MEMBERSHIP_CACHE]
+
+
+def _role_key(course_id, user_id):
+    return f'course_role:{course_id}:{user_id}'
+
+
+def _version_key(user_id):
+    return f'membership_version:{user_id}'
+
+
+def _count(name):
+    # Counts are added to the shared counters in batches, so lookups don't pay for them
+    _pending_stats[name] += 1
+    if sum(_pending_stats[name] for name in STATS_KEYS) >= STATS_FLUSH_SIZE or \
+            time.monotonic() - _pending_stats['since'] >= STATS_FLUSH_INTERVAL:
+        flush_cache_stats()
+
+
+def flush_cache_stats():
+    """Adds counts of this process to the counters shared through MEMBERSHIP_CACHE"""
+    cache = _cache()
+    for name in STATS_KEYS:
+        count, _pending_stats[name] = _pending_stats[name], 0
+        if count:
+            key = f'course_role_stats:{name}'
+            # Counter must exist before incrementing, `add` doesn't reset an existing one
+            cache.add(key, 0, None)
+            cache.incr(key, count)
+    _pending_stats['since'] = time.monotonic()
+
+
+def get_cached_role(course_id, user_id):
+    """
+    Returns role of the user in the course or None if they aren't a member.
+    Roles are shared between requests through MEMBERSHIP_CACHE and are dropped
+    on membership changes, MEMBERSHIP_CACHE_TIMEOUT limits life of missed invalidations.
+    """
+    from courses.models import Membership
+
+    cache = _cache()
+    key = _role_key(course_id, user_id)
+    role = cache.get(key)
+    if role is not None:
+        _count('hits')
+        return None if role == NO_ROLE else role
+
+    _count('misses')
+    role = Membership.objects.\
+        filter(course__id=course_id, user__id=user_id).\
+        values_list('role', flat=True).\
+        first()
+    cache.set(key, NO_ROLE if role is None else role, settings.MEMBERSHIP_CACHE_TIMEOUT)
+    return role
+
+
+def invalidate_role(course_id, user_id):
+    key = _role_key(course_id, user_id)
+    _cache().delete(key)
+    # Roles cached by concurrent requests before the commit would keep old values
+    transaction.on_commit(lambda: _cache().delete(key))
+
+
+def invalidate_memberships(course_id, user_ids):
+    """Drops cached roles of the users in the course after changes which don't send signals"""
+    if not user_ids:
+        return
+    cache = _cache()
+    role_keys = [_role_key(course_id, user_id) for user_id in user_ids]
+    cache.delete_many(role_keys)
+    transaction.on_commit(lambda: _cache().delete_many(role_keys))
+    get_user_model().objects.filter(pk__in=user_ids).update(membership_version=F('membership_version') + 1)
+    invalidate_membership_versions(user_ids)
+
+
+def get_membership_version(user_id):
+    """
+    Version of the user's memberships which changes with any of them, or None if the user
+    is inactive or doesn't exist. It's read from the database when MEMBERSHIP_CACHE is local
+    to the process, as changes made by other processes wouldn't drop it and outdated tokens
+    would be trusted.
+    """
+    shared = is_shared_cache()
+    cache = _cache()
+    key = _version_key(user_id)
+    version = cache.get(key) if shared else None
+    if version is None:
+        user = get_user_model().objects.\
+            filter(pk=user_id).\
+            values_list('membership_version', 'is_active').\
+            first()
+        version = user[0] if user is not None and user[1] else INACTIVE
+        if shared:
+            cache.set(key, version, settings.MEMBERSHIP_CACHE_TIMEOUT)
+    return None if version == INACTIVE else version
+
+
+def is_shared_cache():
+    return settings.CACHES[settings.MEMBERSHIP_CACHE]['BACKEND'] != PROCESS_LOCAL_BACKEND
+
+
+def bump_membership_version(user_id):
+    get_user_model().objects.filter(pk=user_id).update(membership_version=F('membership_version') + 1)
+    invalidate_membership_versions([user_id])
+
+
+def invalidate_membership_versions(user_ids):
+    """Drops cached versions after changes of memberships or of users' activity"""
+    keys = [_version_key(user_id) for user_id in user_ids]
+    _cache().delete_many(keys)
+    # Versions cached by concurrent requests before the commit would keep old values
+    transaction.on_commit(lambda: _cache().delete_many(keys))
+
+
+def get_token_roles(request):
+    """Returns course roles from the request's token or None if it has none or they're outdated"""
+    token = getattr(request, 'auth', None)
+    if token is None or ROLES_CLAIM not in token:
+        return None
+    # Users of tokens with roles carry the version read when they were authenticated
+    if token[VERSION_CLAIM] != request.user.membership_version:
+        return None
+    return token[ROLES_CLAIM]
+
+
+def get_cache_stats():
+    flush_cache_stats()
+    stats = _cache().get_many([f'course_role_stats:{name}' for name in STATS_KEYS])
+    hits, misses = (stats.get(f'course_role_stats:{name}', 0) for name in STATS_KEYS)
+    lookups = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_ratio': hits / lookups if lookups else None}
+
+
+def reset_cache_stats():
+    _pending_stats.update(hits=0, misses=0)
+    _cache().delete_many([f'course_role_stats:{name}' for name in STATS_KEYS])
+
+
+def get_course_role(request, course_id):
+    """
+    Returns role of the requester in the course or None if they aren't a member.
+    The role is looked up once per request and shared by all permission checks.
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return None
+
+    # Views dispatched by manager views wrap the same HttpRequest into their own DRF requests
+    http_request = getattr(request, '_request', request)
+    roles = getattr(http_request, '_course_roles', None)
+    if roles is None:
+        roles = http_request._course_roles = {}
+
+    key = (int(course_id), user.id)
+    if key not in roles:
+        token_roles = get_token_roles(request)
+        if token_roles is not None:
+            roles[key] = token_roles.get(str(course_id), None)
+        else:
+            roles[key] = get_cached_role(course_id, user.id)
+    return roles[key]
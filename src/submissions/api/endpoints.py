@@ -6,6 +6,14 @@ from . import views
 app_name = 'submissions'
 urlpatterns = [
     path('submissions/', views.SubmissionListManageView.as_view(), name='list'),
+    path('submissions/export/', views.SubmissionExportView.as_view(), name='export'),
+    path('submissions/statuses/', views.submission_statuses, name='statuses'),
     path('submissions/<int:submission_id>/', views.SubmissionDetailManageView.as_view(), name='detail'),
-    path('users/<int:user_id>/submissions/', views.UserSubmissionsListManageView.as_view(), name='user-list')
+    path('submissions/<int:submission_id>/logs/<str:stream>/', views.SubmissionLogView.as_view(), name='logs'),
+    path('submissions/<int:submission_id>/events/', views.SubmissionEventsView.as_view(), name='events'),
+    path('gradebook/', views.GradebookView.as_view(), name='gradebook'),
+    path('users/<int:user_id>/submissions/', views.UserSubmissionsListManageView.as_view(), name='user-list'),
+    path('uploads/', views.UploadSessionCreateView.as_view(), name='upload-list'),
+    path('uploads/<uuid:upload_id>/', views.UploadSessionDetailView.as_view(), name='upload-detail'),
+    path('uploads/<uuid:upload_id>/commit/', views.commit_upload, name='upload-commit'),
 ]
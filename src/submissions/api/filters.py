@@ -0,0 +1,23 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+class SubmissionFilterBackend(BaseFilterBackend):
+    """Filters submissions by exact ids given in query parameters"""
+
+    FILTER_FIELDS = {
+        'assignment': 'assignment_id',
+        'status': 'status',
+        'user': 'user_id',
+        'reviewer': 'reviewer_id',
+    }
+
+    def filter_queryset(self, request, queryset, view):
+        for param, lookup in self.FILTER_FIELDS.items():
+            value = request.query_params.get(param)
+            if value is None:
+                continue
+            if not value.isdigit():
+                raise ValidationError({param: ['A valid integer is required.']})
+            queryset = queryset.filter(**{lookup: int(value)})
+        return queryset
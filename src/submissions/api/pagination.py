@@ -0,0 +1,78 @@
+import base64
+import binascii
+
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginates submissions newest first by (datetime, id) key of the last row
+    of a page, so a page costs the same index range scan at any depth.
+    Views may walk another index with the same values by `keyset_ordering`.
+    """
+    limit_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    default_limit = 50
+    max_limit = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.limit = self.get_limit(request)
+        self.request = request
+        datetime_field, id_field = getattr(view, 'keyset_ordering', ('datetime', 'id'))
+        queryset = queryset.order_by(f'-{datetime_field}', f'-{id_field}')
+
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            datetime, pk = cursor
+            queryset = queryset.\
+                filter(**{f'{datetime_field}__lte': datetime}).\
+                exclude(**{datetime_field: datetime, f'{id_field}__gte': pk})
+
+        page = list(queryset[:self.limit + 1])
+        self.has_next = len(page) > self.limit
+        self.page = page[:self.limit]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return self.default_limit
+        if limit < 1:
+            return self.default_limit
+        return min(limit, self.max_limit)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        cursor = self.encode_cursor(last.datetime, last.id)
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            datetime, pk = base64.urlsafe_b64decode(encoded.encode()).decode().split('|')
+            datetime, pk = parse_datetime(datetime), int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound("Invalid cursor")
+        if datetime is None:
+            raise NotFound("Invalid cursor")
+        return datetime, pk
+
+    @staticmethod
+    def encode_cursor(datetime, pk):
+        return base64.urlsafe_b64encode(f'{datetime.isoformat()}|{pk}'.encode()).decode()
@@ -1,6 +1,10 @@
+import os
+
+from django.conf import settings
+from django.utils.text import get_valid_filename
 from rest_framework import serializers
 
-from submissions.models import Submission
+from submissions.models import Submission, UploadSession
 
 
 class SubmissionSerializer(serializers.ModelSerializer):
@@ -47,16 +51,51 @@ class SubmissionSerializer(serializers.ModelSerializer):
         repo_url = validated_data.get('repo_url', "")
         branch = validated_data.get('branch', "")
         source = validated_data.get('source', None)
+        source_digest = getattr(source, 'sha256', "")
 
-        submission = Submission(assignment=assignment, user=user,
-                                repo_url=repo_url, branch=branch, source=source)
+        submission = Submission(assignment=assignment, user=user, repo_url=repo_url, branch=branch,
+                                source=source, source_digest=source_digest)
         submission.save(download_type=download_type)
 
         return submission
 
 
+class SubmissionListSerializer(serializers.ModelSerializer):
+    """Representation of submissions in lists, logs are served by a separate endpoint"""
+    assignment_title = serializers.StringRelatedField(source='assignment.title')
+    user_email = serializers.StringRelatedField(source='user.email')
+    reviewer_email = serializers.StringRelatedField(source='reviewer.email')
+
+    class Meta:
+        model = Submission
+        fields = ('id', 'assignment', 'assignment_title', 'user', 'user_email', 'repo_url', 'branch',
+                  'datetime', 'reviewer', 'reviewer_email', 'status')
+        read_only_fields = fields
+
+
 class SubmissionUpdateSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Submission
         fields = ('reviewer',)
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = UploadSession
+        fields = ('id', 'assignment', 'filename', 'size', 'offset')
+        read_only_fields = ('id', 'offset')
+
+    def validate_filename(self, filename):
+        filename = get_valid_filename(os.path.basename(filename))
+        if not filename:
+            raise serializers.ValidationError("Invalid file name")
+        return filename
+
+    def validate_size(self, size):
+        if size < 1 or size > settings.SUBMISSION_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f"Size must be between 1 and {settings.SUBMISSION_UPLOAD_MAX_SIZE} bytes"
+            )
+        return size
@@ -0,0 +1,49 @@
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle, SimpleRateThrottle, UserRateThrottle
+
+QUEUE_DEPTH_CACHE_KEY = 'submissions_queue_depth'
+
+
+class SubmissionUserRateThrottle(UserRateThrottle):
+    scope = 'submissions_user'
+
+
+class SubmissionCourseRateThrottle(SimpleRateThrottle):
+    scope = 'submissions_course'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': view.kwargs['pk']}
+
+
+class QueueBackpressureThrottle(BaseThrottle):
+    """
+    Rejects new submissions while the grading queue is deeper than SUBMISSION_QUEUE_MAX_DEPTH.
+    Depth is read from the broker at most once in SUBMISSION_QUEUE_CHECK_INTERVAL seconds.
+    """
+
+    def allow_request(self, request, view):
+        if not settings.SUBMISSION_QUEUE_MAX_DEPTH:
+            return True
+
+        depth = cache.get(QUEUE_DEPTH_CACHE_KEY)
+        if depth is None:
+            depth = self.get_queue_depth()
+            cache.set(QUEUE_DEPTH_CACHE_KEY, depth, settings.SUBMISSION_QUEUE_CHECK_INTERVAL)
+        return depth <= settings.SUBMISSION_QUEUE_MAX_DEPTH
+
+    def wait(self):
+        return settings.SUBMISSION_QUEUE_RETRY_AFTER
+
+    @staticmethod
+    def get_queue_depth():
+        queue = getattr(settings, 'CELERY_TASK_DEFAULT_QUEUE', 'celery')
+        try:
+            return redis.Redis.from_url(settings.CELERY_BROKER_URL).llen(queue)
+        except redis.RedisError:
+            # Broker failures aren't a reason to reject submissions
+            return 0
+
+
+SUBMISSION_THROTTLES = (SubmissionUserRateThrottle, SubmissionCourseRateThrottle, QueueBackpressureThrottle)
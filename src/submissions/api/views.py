@@ -1,14 +1,38 @@
+import re
+import hashlib
+
+from django.db import connection, transaction
+from django.db.models import F, Func, IntegerField
+from django.utils.http import parse_etags
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 
 from rest_framework import views, status, generics
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 
-from courses.models import Course
+from courses.models import Course, Membership
 from courses.api.permissions import IsTeacher, IsTA, IsStudent, IsMember
-from submissions.models import Submission
+from courses.utils.responses import ranged_response
+from courses.utils.roles import get_course_role
+from submissions import events
+from submissions.models import Submission, UploadSession
 from submissions.api.permissions import IsSender, IsHimself, UpdateSubmissionReviewer
-from submissions.api.serializers import SubmissionSerializer, SubmissionUpdateSerializer
+from submissions.api.serializers import SubmissionSerializer, SubmissionListSerializer, SubmissionUpdateSerializer,\
+    UploadSessionSerializer
+from submissions.api.filters import SubmissionFilterBackend
+from submissions.api.pagination import KeysetPagination
+from submissions.api.throttles import SUBMISSION_THROTTLES
+from submissions.utils.blobs import hash_file
+from submissions.utils.export import export_submissions
+from submissions.utils.reports import GRADEBOOK_COLUMNS, gradebook_rows, stream_csv, stream_json
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+STATUS_BATCH_MAX_SIZE = 100
+
+LOG_FIELDS = [field for stream in Submission.LOG_STREAMS for field in Submission.log_fields(stream)]
 
 
 class BaseMangerView(views.APIView):
@@ -25,6 +49,7 @@ class SubmissionCreateView(generics.CreateAPIView):
     serializer_class = SubmissionSerializer
     queryset = Submission.objects.all()
     permission_classes = (IsAuthenticated, IsMember)
+    throttle_classes = SUBMISSION_THROTTLES
 
     def post(self, request, *args, **kwargs):
         course_id = kwargs['pk']
@@ -49,19 +74,110 @@ class SubmissionDetailView(generics.RetrieveAPIView):
 
 
 class SubmissionListView(generics.ListAPIView):
-    serializer_class = SubmissionSerializer
+    serializer_class = SubmissionListSerializer
     permission_classes = (IsAuthenticated, IsTeacher | IsTA)
+    filter_backends = (SubmissionFilterBackend,)
+    pagination_class = KeysetPagination
+    # Same values as submission's, kept by the projection to walk its course index
+    keyset_ordering = ('latest_entry__submission_datetime', 'latest_entry__submission_id')
 
     def get_queryset(self):
         course_id = self.kwargs['pk']
-        queryset = Submission.objects.filter(assignment__course__id=course_id)
+        queryset = Submission.objects.\
+            filter(latest_entry__course__id=course_id).\
+            defer(*LOG_FIELDS).\
+            select_related('assignment', 'user', 'reviewer')
         return queryset
 
     def get(self, request, *args, **kwargs):
-        submissions = self.get_queryset().order_by('user', 'assignment', '-datetime').distinct('user', 'assignment')
-        serializer = self.serializer_class(submissions, many=True)
+        submissions = self.filter_queryset(self.get_queryset())
+
+        page = self.paginate_queryset(submissions)
+        serializer = self.serializer_class(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class SubmissionLogView(views.APIView):
+    permission_classes = (IsAuthenticated, IsTeacher | IsTA | IsSender)
+
+    def get(self, request, pk, submission_id, stream):
+        """Streams the log of the submission supporting byte ranges"""
+        if stream not in Submission.LOG_STREAMS:
+            raise Http404
+
+        submission = get_object_or_404(Submission.objects.only('id', *Submission.log_fields(stream)),
+                                       pk=submission_id, assignment__course__id=pk)
+        fileobj, size = submission.open_log(stream)
+        return ranged_response(request, fileobj, size, content_type='text/plain; charset=utf-8')
+
+
+class SubmissionEventsView(views.APIView):
+    permission_classes = (IsAuthenticated, IsTeacher | IsTA | IsSender)
+
+    def perform_content_negotiation(self, request, force=False):
+        # Event stream clients accept only text/event-stream, errors are rendered as JSON anyway
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, pk, submission_id):
+        """Streams status changes and output of the submission as server-sent events"""
+        # Subscribing before reading the status, so changes in between aren't missed
+        pubsub = events.subscribe(submission_id)
+        submission_status = Submission.objects.\
+            filter(pk=submission_id, assignment__course__id=pk).\
+            values_list('status', flat=True).\
+            first()
+        if submission_status is None:
+            if pubsub is not None:
+                pubsub.close()
+            raise Http404
+
+        # Idle stream shouldn't hold a database connection, unless the request runs in a transaction
+        if not connection.in_atomic_block:
+            connection.close()
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        response = StreamingHttpResponse(events.event_stream(submission_status, pubsub),
+                                         content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class GradebookView(views.APIView):
+    permission_classes = (IsAuthenticated, IsTeacher | IsTA)
+
+    def get(self, request, pk):
+        """Streams latest status, attempts and reviewer for every user and assignment as JSON or CSV"""
+        report_type = request.query_params.get('type', 'json')
+        rows = gradebook_rows(pk)
+
+        if report_type == 'csv':
+            response = StreamingHttpResponse(stream_csv(GRADEBOOK_COLUMNS, rows), content_type='text/csv')
+            response['Content-Disposition'] = f'attachment; filename="gradebook_{pk}.csv"'
+        elif report_type == 'json':
+            response = StreamingHttpResponse(stream_json(GRADEBOOK_COLUMNS, rows), content_type='application/json')
+        else:
+            return Response({'error': 'Unknown report type'}, status=status.HTTP_400_BAD_REQUEST)
+        return response
+
+
+class SubmissionExportView(views.APIView):
+    permission_classes = (IsAuthenticated, IsTeacher)
+
+    def get(self, request, pk):
+        """Streams tar archive with all submissions of the course or of its assignment"""
+        submissions = Submission.objects.filter(assignment__course__id=pk)
+        filename = f'course_{pk}_submissions.tar'
+
+        assignment_id = request.query_params.get('assignment', None)
+        if assignment_id is not None:
+            if not assignment_id.isdigit():
+                return Response({'error': 'assignment must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+            submissions = submissions.filter(assignment__id=assignment_id)
+            filename = f'course_{pk}_assignment_{assignment_id}_submissions.tar'
+
+        response = StreamingHttpResponse(export_submissions(submissions), content_type='application/x-tar')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
 
 
 class SubmissionUpdateView(generics.UpdateAPIView):
@@ -86,18 +202,21 @@ class SubmissionDetailManageView(BaseMangerView):
 
 
 class UserSubmissionsListView(generics.ListAPIView):
-    queryset = Submission.objects.all()
-    serializer_class = SubmissionSerializer
+    queryset = Submission.objects.defer(*LOG_FIELDS).select_related('assignment', 'user', 'reviewer')
+    serializer_class = SubmissionListSerializer
     permission_classes = (IsAuthenticated, IsMember, IsHimself)
+    filter_backends = (SubmissionFilterBackend,)
+    pagination_class = KeysetPagination
 
     def get(self, request, *args, **kwargs):
         course_id = kwargs.get('pk')
-        assignment_id = kwargs.get('assignment_id')
         user_id = kwargs.get('user_id')
         submissions = self.queryset.filter(assignment__course__id=course_id, user__id=user_id)
-        serializer = self.serializer_class(submissions, many=True)
+        submissions = self.filter_queryset(submissions)
 
-        return Response(serializer.data, status.HTTP_200_OK)
+        page = self.paginate_queryset(submissions)
+        serializer = self.serializer_class(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
 
 class UserSubmissionsListManageView(BaseMangerView):
@@ -106,3 +225,136 @@ class UserSubmissionsListManageView(BaseMangerView):
     }
 
 
+class UploadSessionCreateView(views.APIView):
+    serializer_class = UploadSessionSerializer
+    permission_classes = (IsAuthenticated, IsMember)
+
+    def post(self, request, **kwargs):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        if serializer.validated_data['assignment'].course_id != kwargs['pk']:
+            return Response({'assignment': ['Assignment doesn\'t belong to the course']},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        serializer.save(user=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class UploadSessionDetailView(views.APIView):
+    serializer_class = UploadSessionSerializer
+    permission_classes = (IsAuthenticated, IsMember)
+
+    def get_object(self):
+        return get_object_or_404(UploadSession, pk=self.kwargs['upload_id'], user=self.request.user,
+                                 assignment__course__id=self.kwargs['pk'])
+
+    def get(self, request, **kwargs):
+        upload = self.get_object()
+        return Response(self.serializer_class(upload).data, status=status.HTTP_200_OK)
+
+    def put(self, request, **kwargs):
+        """Receives a chunk of the file described by Content-Range header"""
+        upload = self.get_object()
+
+        match = CONTENT_RANGE_RE.match(request.META.get('HTTP_CONTENT_RANGE', ''))
+        if match is None:
+            return Response({'error': 'Content-Range header must be provided'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        start, end, total = map(int, match.groups())
+        if total != upload.size or start > end or end >= total:
+            return Response({'error': 'Invalid range'},
+                            status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+
+        # Chunks are accepted only contiguously, so the offset always marks the uploaded prefix
+        if start > upload.offset:
+            return Response({'error': 'Chunk starts beyond uploaded data', 'offset': upload.offset},
+                            status=status.HTTP_409_CONFLICT)
+
+        length = end - start + 1
+        if upload.write(request.stream, start, length) != length:
+            return Response({'error': 'Chunk is shorter than its range', 'offset': upload.offset},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        UploadSession.objects.filter(pk=upload.pk, offset__lte=end).update(offset=end + 1)
+        upload.refresh_from_db()
+        return Response(self.serializer_class(upload).data, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes((IsAuthenticated, IsMember))
+@throttle_classes(SUBMISSION_THROTTLES)
+def commit_upload(request, pk, upload_id):
+    checksum = request.data.get('sha256', None)
+    if checksum is None:
+        return Response({'error': 'No sha256 checksum given'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Concurrent commits of the session wait here, so its file becomes a single submission
+    with transaction.atomic():
+        upload = get_object_or_404(UploadSession.objects.select_for_update(),
+                                   pk=upload_id, user=request.user, assignment__course__id=pk)
+
+        if upload.offset != upload.size:
+            return Response({'error': 'Upload is incomplete', 'offset': upload.offset},
+                            status=status.HTTP_409_CONFLICT)
+
+        digest = hash_file(upload.staged_path)
+        if digest != checksum.lower():
+            return Response({'error': 'Checksum mismatch'}, status=status.HTTP_400_BAD_REQUEST)
+
+        submission = upload.commit(digest)
+
+    if submission is None:
+        return Response({'error': 'Upload is already committed'}, status=status.HTTP_409_CONFLICT)
+    return Response(SubmissionSerializer(submission).data, status=status.HTTP_201_CREATED)
+
+
+class OctetLength(Func):
+    function = 'OCTET_LENGTH'
+    output_field = IntegerField()
+
+
+@api_view(['GET'])
+@permission_classes((IsAuthenticated,))
+def submission_statuses(request, pk):
+    """
+    Returns short states of submissions given by `ids` query parameter,
+    or of all requester's submissions in the course when it's omitted.
+    """
+    role = get_course_role(request, pk)
+    if role is None:
+        return Response(status=status.HTTP_403_FORBIDDEN)
+
+    submissions = Submission.objects.filter(assignment__course__id=pk)
+    ids = request.query_params.get('ids', None)
+    if ids is None:
+        submissions = submissions.filter(user=request.user)
+    else:
+        ids = [value for value in ids.split(',') if value]
+        if not all(value.isdigit() for value in ids):
+            return Response({'error': 'ids must be comma separated integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > STATUS_BATCH_MAX_SIZE:
+            return Response({'error': f'At most {STATUS_BATCH_MAX_SIZE} ids can be requested'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        submissions = submissions.filter(id__in=ids)
+        if role == Membership.STUDENT:
+            submissions = submissions.filter(user=request.user)
+
+    # Legacy logs are counted by their stored length, so the log columns aren't read
+    submissions = submissions.\
+        annotate(log_size=F('stdout_size') + F('stderr_size') +
+                 OctetLength('legacy_stdout') + OctetLength('legacy_stderr')).\
+        order_by('id').\
+        values_list('id', 'status', 'datetime', 'log_size')
+
+    data = [
+        {'id': submission_id, 'status': submission_status, 'datetime': datetime, 'log_size': log_size}
+        for submission_id, submission_status, datetime, log_size in submissions
+    ]
+    digest = hashlib.sha1(repr([tuple(item.values()) for item in data]).encode()).hexdigest()
+    etag = f'"{digest}"'
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+    return Response(data, headers={'ETag': etag})
@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_save, post_delete
 
 
 class SubmissionsConfig(AppConfig):
     name = 'submissions'
 
+    def ready(self):
+        from submissions import events
+        from submissions.models import Submission
+        from submissions.signals import output_received, remove_sources, refresh_latest_submission
+
+        post_save.connect(events.publish_status, sender=Submission, dispatch_uid='submissions_publish_status')
+        output_received.connect(events.publish_output, dispatch_uid='submissions_publish_output')
+        post_delete.connect(remove_sources, sender=Submission, dispatch_uid='submissions_remove_sources')
+        post_delete.connect(refresh_latest_submission, sender=Submission,
+                            dispatch_uid='submissions_refresh_latest_submission')
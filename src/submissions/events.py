@@ -0,0 +1,98 @@
+import json
+
+import redis
+from django.conf import settings
+from django.db import transaction
+
+_client = None
+
+
+def get_client():
+    global _client
+
+    if not settings.SUBMISSION_EVENTS_URL:
+        return None
+    if _client is None:
+        _client = redis.Redis.from_url(settings.SUBMISSION_EVENTS_URL)
+    return _client
+
+
+def channel(submission_id):
+    return f'submissions:{submission_id}'
+
+
+def publish(submission_id, event, data):
+    client = get_client()
+    if client is None:
+        return
+
+    try:
+        client.publish(channel(submission_id), json.dumps({'event': event, 'data': data}))
+    except redis.RedisError:
+        # Events are best effort, clients get the actual state when they reconnect
+        pass
+
+
+def subscribe(submission_id):
+    """Returns pubsub subscribed to events of the submission or None if events aren't published"""
+    client = get_client()
+    if client is None:
+        return None
+
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    try:
+        pubsub.subscribe(channel(submission_id))
+    except redis.RedisError:
+        pubsub.close()
+        return None
+    return pubsub
+
+
+def format_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'.encode()
+
+
+def event_stream(status, pubsub):
+    """
+    Yields server-sent events starting with the current status until the submission is finished.
+    While nothing happens only heartbeat comments are sent, so proxies keep the connection open.
+    """
+    from submissions.models import Submission
+
+    try:
+        yield f'retry: {settings.SUBMISSION_EVENTS_RETRY * 1000}\n\n'.encode()
+        yield format_event('status', {'status': status})
+        if pubsub is None or status != Submission.PROCESSING:
+            return
+
+        while True:
+            message = pubsub.get_message(timeout=settings.SUBMISSION_EVENTS_HEARTBEAT)
+            if message is None:
+                yield b': heartbeat\n\n'
+                continue
+
+            payload = json.loads(message['data'])
+            yield format_event(payload['event'], payload['data'])
+            if payload['event'] == 'status' and payload['data']['status'] != Submission.PROCESSING:
+                return
+    except redis.RedisError:
+        # Client reconnects after `retry` seconds and gets the actual status
+        return
+    finally:
+        if pubsub is not None:
+            pubsub.close()
+
+
+def publish_status(sender, instance, created, update_fields=None, **kwargs):
+    # Only changes are published and only once they are committed
+    if update_fields is not None and 'status' not in update_fields:
+        return
+
+    changed = not created and instance.status != instance.stored_status
+    instance.stored_status = status = instance.status
+    if changed:
+        transaction.on_commit(lambda: publish(instance.id, 'status', {'status': status}))
+
+
+def publish_output(sender, submission_id, text, **kwargs):
+    publish(submission_id, 'output', {'text': text})
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from courses.checks import PROCESS_LOCAL_BACKEND
+from submissions.utils.artifacts import get_cache_stats, reset_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Shows hit ratio of the rules' artifact cache over all workers and disk usage of this machine's cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Reset counters after showing them")
+
+    def handle(self, *args, **options):
+        if settings.CACHES[settings.ARTIFACT_CACHE_STATS_CACHE]['BACKEND'] == PROCESS_LOCAL_BACKEND:
+            self.stderr.write("ARTIFACT_CACHE_STATS_CACHE is local to each process, counters of workers can't be read")
+
+        stats = get_cache_stats()
+        ratio = 'n/a' if stats['hit_ratio'] is None else f"{stats['hit_ratio']:.2%}"
+        self.stdout.write(f"Hits: {stats['hits']}, misses: {stats['misses']}, hit ratio: {ratio}")
+        self.stdout.write(f"Artifacts: {stats['artifacts']}, size: {stats['size']} bytes")
+
+        if options['reset']:
+            reset_cache_stats()
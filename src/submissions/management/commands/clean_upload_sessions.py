@@ -0,0 +1,25 @@
+import os
+import shutil
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from submissions.models import UploadSession
+
+
+class Command(BaseCommand):
+    help = "Removes upload sessions which were abandoned before commit along with their staged files"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help="Age of sessions to be removed")
+
+    def handle(self, *args, **options):
+        threshold = timezone.now() - timedelta(hours=options['hours'])
+        sessions = UploadSession.objects.filter(created__lt=threshold)
+
+        for upload in sessions:
+            shutil.rmtree(os.path.dirname(upload.staged_path), ignore_errors=True)
+
+        count, _ = sessions.delete()
+        self.stdout.write(f"Removed {count} upload sessions")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from submissions.utils.blobs import BlobStore
+
+
+class Command(BaseCommand):
+    help = "Removes stored sources which are not referenced by any submission"
+
+    def handle(self, *args, **options):
+        freed = BlobStore().collect_garbage()
+        self.stdout.write(f"Freed {freed} bytes")
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from submissions.models import Submission
+from submissions.utils.logs import compress
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = "Moves logs of submissions from plain columns into compressed ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        for stream in Submission.LOG_STREAMS:
+            count = self.compress_stream(stream, options['batch_size'])
+            self.stdout.write(f"Compressed {stream} of {count} submissions")
+
+    @staticmethod
+    def compress_stream(stream, batch_size):
+        legacy_field, compressed_field, size_field = Submission.log_fields(stream)
+        pending = Submission.objects.\
+            filter(**{f'{compressed_field}__isnull': True}).\
+            exclude(**{legacy_field: ""}).\
+            order_by('id')
+
+        count, last_id = 0, 0
+        while True:
+            batch = list(pending.filter(id__gt=last_id).values_list('id', legacy_field)[:batch_size])
+            if not batch:
+                return count
+
+            # Each batch is a short transaction, rows written meanwhile are compressed already and skipped
+            with transaction.atomic():
+                for pk, text in batch:
+                    compressed, size = compress(text)
+                    count += pending.filter(id=pk).update(**{
+                        legacy_field: "", compressed_field: compressed, size_field: size,
+                    })
+            last_id = batch[-1][0]
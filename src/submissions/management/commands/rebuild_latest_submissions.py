@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Min, Window
+
+from submissions.models import Submission, LatestSubmission
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = "Backfills or rebuilds the latest submissions projection"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, help="Rebuild only the given course")
+
+    def handle(self, *args, **options):
+        submissions = Submission.objects.all()
+        entries = LatestSubmission.objects.all()
+        if options['course'] is not None:
+            submissions = submissions.filter(assignment__course__id=options['course'])
+            entries = entries.filter(course__id=options['course'])
+
+        # Window functions are computed before DISTINCT ON picks the latest row of each pair
+        partition = [F('user'), F('assignment')]
+        latest = submissions.\
+            annotate(attempts=Window(Count('id'), partition_by=partition),
+                     first_datetime=Window(Min('datetime'), partition_by=partition)).\
+            order_by('user', 'assignment', '-datetime', '-id').\
+            distinct('user', 'assignment').\
+            values_list('id', 'datetime', 'assignment_id', 'user_id', 'assignment__course_id',
+                        'attempts', 'first_datetime')
+
+        count = 0
+        with transaction.atomic():
+            entries.delete()
+
+            batch = []
+            for submission_id, datetime, assignment_id, user_id, course_id, attempts, first_datetime in \
+                    latest.iterator(chunk_size=BATCH_SIZE):
+                batch.append(LatestSubmission(submission_id=submission_id, submission_datetime=datetime,
+                                              assignment_id=assignment_id,
+                                              user_id=user_id, course_id=course_id,
+                                              attempts=attempts, first_datetime=first_datetime))
+                if len(batch) == BATCH_SIZE:
+                    count += len(LatestSubmission.objects.bulk_create(batch))
+                    batch = []
+            count += len(LatestSubmission.objects.bulk_create(batch))
+
+        self.stdout.write(f"Rebuilt {count} latest submissions")
@@ -1,14 +1,26 @@
+import io
 import os
-from django.db import models
+import codecs
+import uuid
+from django.db import models, transaction
+from django.db.models import Count, F, Min
 from django.contrib.auth import get_user_model
 from django.conf import settings
 
 from celery import chain
 
-from courses.models import Assignment
+from courses.models import Course, Assignment
+from courses.utils.plans import get_plan
 from submissions.utils import random_temporary_dir
 from submissions.utils import docker
-from submissions.tasks import perform_submission, prepare_sources
+from submissions.utils.blobs import CHUNK_SIZE
+from submissions.utils.logs import compress, decompress, CompressedLogReader
+from submissions.signals import output_received
+from submissions import events
+from submissions.tasks import perform_submission, prepare_sources, submission_task_ids
+from submissions.utils.watchdog import Watchdog
+from submissions.utils.artifacts import execute_cached
+from config.celery import app
 
 User = get_user_model()
 
@@ -17,70 +29,350 @@ class Submission(models.Model):
     PROCESSING = 0
     PERFORMED = 1
     FAILED = 2
+    SUPERSEDED = 3
 
     STATUS_CHOICES = (
         (PROCESSING, 'processing'),
         (PERFORMED, 'performed'),
         (FAILED, 'failed'),
+        (SUPERSEDED, 'superseded'),
     )
 
     STRATEGY_SOURCES = 'sources'
     STRATEGY_REPOSITORY = 'repository'
 
+    LOG_STREAMS = ('stdout', 'stderr')
+
     assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, related_name='submissions')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='submissions')
     reviewer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reviewed_submissions', null=True)
     repo_url = models.CharField(max_length=255, blank=True)
     branch = models.CharField(max_length=100, blank=True)
     source = models.FileField(upload_to=random_temporary_dir, null=True, default=None)
+    source_digest = models.CharField(max_length=64, blank=True)
     datetime = models.DateTimeField(auto_now_add=True)
     status = models.PositiveIntegerField(choices=STATUS_CHOICES, default=PROCESSING)
-    stdout = models.TextField(default="")
-    stderr = models.TextField(default="")
+    # Logs are stored compressed, plain columns are kept for rows written before
+    # and emptied by `compress_submission_logs` command
+    legacy_stdout = models.TextField(default="", db_column='stdout')
+    legacy_stderr = models.TextField(default="", db_column='stderr')
+    stdout_compressed = models.BinaryField(null=True, default=None)
+    stderr_compressed = models.BinaryField(null=True, default=None)
+    stdout_size = models.PositiveIntegerField(default=0)
+    stderr_size = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # Keyset pagination walks these indexes newest first after filtering by one of the fields
+        indexes = [
+            models.Index(fields=['assignment', '-datetime', '-id']),
+            models.Index(fields=['user', '-datetime', '-id']),
+            models.Index(fields=['reviewer', '-datetime', '-id']),
+            models.Index(fields=['status', '-datetime', '-id']),
+        ]
+
+    # Status as it is stored, so saving publishes only its changes
+    stored_status = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.stored_status = instance.__dict__.get('status')
+        return instance
 
     def save(self, download_type=None, *args, **kwargs):
         pk = self.pk
 
-        super().save(*args, **kwargs)
-
         if pk is not None:
+            super().save(*args, **kwargs)
             return
 
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            LatestSubmission.objects.track(self)
+            if self.assignment.cancel_superseded:
+                self.supersede_previous()
+
         if download_type is not None:
-            chain(
-                prepare_sources.si(self.id, download_type),
-                perform_submission.si(self.id),
-            )()
+            self.enqueue(download_type)
+
+    def enqueue(self, download_type):
+        """Starts preparing sources of the submission and then performing it"""
+        prepare_task_id, perform_task_id = submission_task_ids(self.id)
+        chain(
+            prepare_sources.si(self.id, download_type).set(task_id=prepare_task_id),
+            perform_submission.si(self.id).set(task_id=perform_task_id),
+        )()
+
+    def supersede_previous(self):
+        """
+        Marks unfinished previous submissions of the user for the assignment as superseded.
+        Their queued tasks are revoked, running ones notice the status and stop the container.
+        """
+        previous = Submission.objects.filter(assignment_id=self.assignment_id, user_id=self.user_id,
+                                             status=Submission.PROCESSING, id__lt=self.id)
+        superseded_ids = list(previous.values_list('id', flat=True))
+        if not superseded_ids:
+            return
+        previous.filter(id__in=superseded_ids).update(status=Submission.SUPERSEDED)
+
+        def notify():
+            task_ids = [task_id for pk in superseded_ids for task_id in submission_task_ids(pk)]
+            app.control.revoke(task_ids)
+            for pk in superseded_ids:
+                events.publish(pk, 'status', {'status': Submission.SUPERSEDED})
+
+        transaction.on_commit(notify)
+
+    def is_superseded(self):
+        return Submission.objects.filter(pk=self.pk, status=Submission.SUPERSEDED).exists()
 
     def run(self):
-        container_name = f'{self.id}_{self.assignment.environment.tag}'
-        student_attachments_dir = os.path.join(settings.HOST_MEDIA_ROOT, self.store_dir)
-        teacher_attachments_dir = os.path.join(settings.HOST_MEDIA_ROOT, self.assignment.course.attachments_path)
-
-        with docker.DockerContainer(self.assignment.environment.tag, container_name) as container:
-            container.run('-i', '-d',
-                          f'--volume={student_attachments_dir}:/student-attachments:ro',
-                          f'--volume={teacher_attachments_dir}:/teacher-attachments:ro',
-                          command='bash')
-            container.exec(command='bash', command_args=['-c', "'cp /student-attachments/* /src'"])
-            container.exec(command='bash', command_args=['-c', "'cp /teacher-attachments/* /src'"])
-
-            self.status = Submission.PERFORMED
-            for rule in self.assignment.rules.order_by('order'):
-                timeout = f"timeout {rule.timeout}" if rule.timeout else ''
-                ret_code = container.exec(command='bash', command_args=['-c', f"'{timeout} {rule.command}'"])
-                if ret_code != 0 and not rule.continue_on_fail:
-                    self.status = Submission.FAILED
-                    break
+        # Everything needed before the container starts comes from the cached plan
+        plan = get_plan(self.assignment_id, self.assignment.plan_version)
+        container_name = f'{self.id}_{plan.image}'
+        student_attachments_dir = os.path.join(settings.HOST_MEDIA_ROOT,
+                                               self.get_store_dir(plan.course_id, self.id))
+        volumes = [f'--volume={student_attachments_dir}:/student-attachments:ro', *plan.volumes]
+
+        # Chunks may split multibyte characters, so they are decoded incrementally
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+        def send_output(chunk):
+            output_received.send(sender=Submission, submission_id=self.id, text=decoder.decode(chunk))
+
+        watchdog = None
+        with docker.DockerContainer(plan.image, container_name, on_output=send_output) as container:
+            container.run('-i', '-d', *volumes, command='bash')
+            if plan.cancel_superseded:
+                # Stopping the container interrupts a running rule as soon as a newer submission comes
+                watchdog = Watchdog(self.is_superseded, container.stop, settings.SUBMISSION_SUPERSEDED_CHECK_INTERVAL)
+                watchdog.start()
+
+            try:
+                self.status = self._perform(container, plan, watchdog)
+            except docker.DockerException:
+                # Commands can't be executed in the container stopped by the watchdog
+                if watchdog is None or not watchdog.triggered:
+                    raise
+            finally:
+                if watchdog is not None:
+                    watchdog.stop()
+
+        if watchdog is not None and watchdog.triggered:
+            self.status = Submission.SUPERSEDED
+        self.finish(self.status, container.output)
+
+    def finish(self, status, output):
+        """Stores output and resulting status, unless the submission was superseded meanwhile"""
+        with transaction.atomic():
+            updated = Submission.objects.\
+                filter(pk=self.pk, status=Submission.PROCESSING).\
+                update(status=status)
+            if updated:
+                self.status = self.stored_status = status
+                transaction.on_commit(lambda: events.publish(self.id, 'status', {'status': status}))
+            else:
+                self.status = Submission.objects.filter(pk=self.pk).values_list('status', flat=True).get()
+            self.stdout = output
+            self.save(update_fields=Submission.log_fields('stdout'))
+
+    def _perform(self, container, plan, watchdog):
+        """Executes steps of the plan in the container and returns resulting status"""
+        container.exec(command='bash', command_args=['-c', "'cp -R /student-attachments/. /src'"])
+        if plan.volumes:
+            container.exec(command='bash',
+                           command_args=['-c', "'tar -xf /teacher-attachments.tar --no-same-owner -C /src'"])
+
+        for step in plan.steps:
+            if watchdog is not None and watchdog.triggered:
+                break
+            if step.cache is not None and settings.ARTIFACT_CACHE_MAX_SIZE:
+                ret_code = execute_cached(container, step, plan.assignment_id)
+            else:
+                ret_code = container.exec(command='bash', command_args=['-c', step.command])
+            if ret_code != 0 and not step.continue_on_fail:
+                return Submission.FAILED
+        return Submission.PERFORMED
+
+    def get_log(self, stream):
+        compressed = getattr(self, f'{stream}_compressed')
+        if compressed is None:
+            return getattr(self, f'legacy_{stream}')
+        return decompress(compressed)
+
+    def set_log(self, stream, text):
+        compressed, size = compress(text)
+        setattr(self, f'{stream}_compressed', compressed)
+        setattr(self, f'{stream}_size', size)
+        setattr(self, f'legacy_{stream}', "")
+
+    def open_log(self, stream):
+        """Returns file-like object with utf-8 encoded log and its size"""
+        compressed = getattr(self, f'{stream}_compressed')
+        if compressed is None:
+            content = getattr(self, f'legacy_{stream}').encode()
+            return io.BytesIO(content), len(content)
+        return CompressedLogReader(compressed), getattr(self, f'{stream}_size')
+
+    @classmethod
+    def log_fields(cls, stream):
+        """Names of the fields needed to read the log"""
+        return f'legacy_{stream}', f'{stream}_compressed', f'{stream}_size'
+
+    @property
+    def stdout(self):
+        return self.get_log('stdout')
+
+    @stdout.setter
+    def stdout(self, text):
+        self.set_log('stdout', text)
 
-        self.stdout = container.output
-        self.save()
+    @property
+    def stderr(self):
+        return self.get_log('stderr')
+
+    @stderr.setter
+    def stderr(self, text):
+        self.set_log('stderr', text)
 
     @property
     def store_dir(self):
         """Location within MEDIA_ROOT directory where submission should be stored."""
-        course_id = self.assignment.course.id
-        return f"courses/course_{course_id}/submissions/submission_{self.id}"
+        return self.get_store_dir(self.assignment.course_id, self.id)
+
+    @staticmethod
+    def get_store_dir(course_id, submission_id):
+        return f"courses/course_{course_id}/submissions/submission_{submission_id}"
 
     def __str__(self):
         return f"Submission <id={self.id}, user='{self.user}', assignment='{self.assignment}'>"
+
+
+class LatestSubmissionManager(models.Manager):
+
+    def track(self, submission):
+        """Points the entry to a just created submission counting the attempt"""
+        entry, created = self.get_or_create(
+            assignment_id=submission.assignment_id, user_id=submission.user_id,
+            defaults={'course_id': submission.assignment.course_id, 'submission': submission,
+                      'submission_datetime': submission.datetime,
+                      'attempts': 1, 'first_datetime': submission.datetime},
+        )
+        if not created:
+            self.filter(pk=entry.pk).update(submission=submission, submission_datetime=submission.datetime,
+                                            attempts=F('attempts') + 1)
+
+    def refresh(self, assignment_id, user_id):
+        """Points the entry to the latest existing submission of the user for the assignment"""
+        latest = Submission.objects.\
+            filter(assignment_id=assignment_id, user_id=user_id).\
+            select_related('assignment').\
+            order_by('-datetime', '-id').\
+            first()
+        if latest is None:
+            self.filter(assignment_id=assignment_id, user_id=user_id).delete()
+            return None
+
+        stats = Submission.objects.\
+            filter(assignment_id=assignment_id, user_id=user_id).\
+            aggregate(attempts=Count('id'), first_datetime=Min('datetime'))
+        entry, _ = self.update_or_create(
+            assignment_id=assignment_id, user_id=user_id,
+            defaults={'course_id': latest.assignment.course_id, 'submission': latest,
+                      'submission_datetime': latest.datetime, **stats},
+        )
+        return entry
+
+
+class LatestSubmission(models.Model):
+    """
+    Projection of the latest submission for each (assignment, user) pair, which is
+    maintained along with submissions. Status and other fields are read through
+    `submission`, so only creation and deletion of submissions touch it.
+    Count of attempts and time of the first one are kept for the gradebook.
+    """
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+')
+    assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, related_name='+')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    submission = models.OneToOneField(Submission, on_delete=models.CASCADE, related_name='latest_entry')
+    # Copy of the submission's datetime, so teacher's list is paged by the course index
+    submission_datetime = models.DateTimeField(null=True)
+    attempts = models.PositiveIntegerField(default=1)
+    first_datetime = models.DateTimeField(null=True)
+
+    objects = LatestSubmissionManager()
+
+    class Meta:
+        unique_together = ('assignment', 'user')
+        index_together = ('course', 'user', 'assignment')
+        indexes = [
+            models.Index(fields=['course', '-submission_datetime', '-submission']),
+        ]
+
+    def __str__(self):
+        return f"LatestSubmission <user='{self.user}', assignment='{self.assignment}'>"
+
+
+class UploadSession(models.Model):
+    """
+    Resumable upload of a submission's sources. Chunks are written right into
+    the staged file, which becomes the submission's source on commit.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, related_name='upload_sessions')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveIntegerField()
+    offset = models.PositiveIntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def staged_name(self):
+        """Location within MEDIA_ROOT directory where uploaded chunks are written."""
+        return f"tmp/upload_{self.id.hex}/{self.filename}"
+
+    @property
+    def staged_path(self):
+        return os.path.join(settings.MEDIA_ROOT, self.staged_name)
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+
+        super().save(*args, **kwargs)
+
+        if adding:
+            os.makedirs(os.path.dirname(self.staged_path), exist_ok=True)
+            open(self.staged_path, 'wb').close()
+
+    def write(self, stream, start, length):
+        """Writes chunk of the upload at a given position, returns count of written bytes"""
+        written = 0
+        with open(self.staged_path, 'r+b') as f:
+            f.seek(start)
+            while written < length:
+                chunk = stream.read(min(CHUNK_SIZE, length - written))
+                if not chunk:
+                    break
+                f.write(chunk)
+                written += len(chunk)
+        return written
+
+    def commit(self, digest):
+        """
+        Turns completely uploaded file into a submission without copying it.
+        Returns None when the session was committed or removed meanwhile.
+        """
+        with transaction.atomic():
+            # The staged file now belongs to the submission, so only the row is removed
+            deleted, _ = UploadSession.objects.filter(pk=self.pk).delete()
+            if not deleted:
+                return None
+            submission = Submission(assignment=self.assignment, user=self.user,
+                                    source=self.staged_name, source_digest=digest)
+            submission.save()
+            # Workers have to see the submission
+            transaction.on_commit(lambda: submission.enqueue(Submission.STRATEGY_SOURCES))
+        return submission
+
+    def __str__(self):
+        return f"UploadSession <id={self.id}, user='{self.user}', filename='{self.filename}'>"
@@ -0,0 +1,79 @@
+import os
+import shutil
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.dispatch import Signal
+
+# Sent by a running submission for every piece of the container's output
+output_received = Signal(providing_args=['submission_id', 'text'])
+
+# Batches of delete handlers collected within the current transaction of the thread
+_batches = threading.local()
+
+
+class _Batch:
+    """
+    Items collected by a handler until the current transaction commits, they are processed
+    at once then. Cascades and queryset deletes send a signal for every row, so handlers
+    collect distinct items and do their work once per item.
+    """
+
+    def __init__(self, name, process):
+        self.name = name
+        self.process = process
+        self.items = {}
+        # Values looked up by the handler, shared by items of the batch
+        self.lookups = {}
+        self._scheduled = False
+
+    def add(self, key, value=None):
+        self.items[key] = value
+        if not self._scheduled:
+            self._scheduled = True
+            transaction.on_commit(self.run)
+
+    def run(self):
+        if getattr(_batches, self.name, None) is self:
+            setattr(_batches, self.name, None)
+        self.process(self.items)
+
+
+def _get_batch(name, process):
+    batch = getattr(_batches, name, None)
+    # Batch of a rolled back transaction is dropped along with its callback
+    if batch is None or not any(func == batch.run for _, func in transaction.get_connection().run_on_commit):
+        batch = _Batch(name, process)
+        setattr(_batches, name, batch)
+    return batch
+
+
+def _remove_store_dirs(store_dirs):
+    for store_dir in store_dirs:
+        shutil.rmtree(os.path.join(settings.MEDIA_ROOT, store_dir), ignore_errors=True)
+
+
+def remove_sources(sender, instance, **kwargs):
+    # Dropping links to the stored blobs, they are collected afterwards. Handling the signal
+    # covers cascades and queryset deletes, sources are kept if the deletion is rolled back
+    from courses.models import Assignment
+
+    batch = _get_batch('sources', _remove_store_dirs)
+    if instance.assignment_id not in batch.lookups:
+        batch.lookups[instance.assignment_id] = Assignment.objects.\
+            filter(pk=instance.assignment_id).values_list('course_id', flat=True).first()
+    batch.add(instance.get_store_dir(batch.lookups[instance.assignment_id], instance.id))
+
+
+def _refresh_latest_submissions(pairs):
+    from submissions.models import LatestSubmission
+
+    for assignment_id, user_id in pairs:
+        LatestSubmission.objects.refresh(assignment_id, user_id)
+
+
+def refresh_latest_submission(sender, instance, **kwargs):
+    # Queryset deletes and cascades remove the projection's entry along with the submission,
+    # each (assignment, user) pair of deleted submissions is refreshed once
+    _get_batch('latest_submissions', _refresh_latest_submissions).add((instance.assignment_id, instance.user_id))
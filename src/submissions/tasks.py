@@ -1,15 +1,25 @@
 from django.conf import settings
 
 from config.celery import app
+from submissions.utils.archives import ArchiveError
 from submissions.utils.downloader import (
     DownloadManager, UploadedSourcesStrategy, DownloadRepositoryStrategy
 )
 
 
+def submission_task_ids(submission_id):
+    """Ids of the submission's tasks are known in advance, so queued tasks can be revoked"""
+    return f'prepare-sources-{submission_id}', f'perform-submission-{submission_id}'
+
+
 @app.task
 def perform_submission(submission_id):
     from submissions.models import Submission
-    submission = Submission.objects.get(pk=submission_id)
+    # Assignment's plan version tells whether the cached execution plan is current
+    submission = Submission.objects.select_related('assignment').get(pk=submission_id)
+    # Revoked task may still be started by a worker which hasn't got the revocation yet
+    if submission.status == Submission.SUPERSEDED:
+        return
     submission.run()
 
 
@@ -18,6 +28,9 @@ def prepare_sources(submission_id, download_type):
     from submissions.models import Submission
 
     submission = Submission.objects.get(pk=submission_id)
+    if submission.status == Submission.SUPERSEDED:
+        return
+
     downloader = DownloadManager()
 
     if download_type == Submission.STRATEGY_SOURCES:
@@ -25,4 +38,11 @@ def prepare_sources(submission_id, download_type):
     elif download_type == Submission.STRATEGY_REPOSITORY:
         downloader.strategy = DownloadRepositoryStrategy(submission)
 
-    downloader.download()
+    try:
+        downloader.download()
+    except ArchiveError as e:
+        # Failing the task stops the chain, so the submission won't be performed
+        submission.status = Submission.FAILED
+        submission.stderr = str(e)
+        submission.save()
+        raise
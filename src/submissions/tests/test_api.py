@@ -1,3 +1,13 @@
+import io
+import os
+import csv
+import json
+import shutil
+import tarfile
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
@@ -8,7 +18,8 @@ from rest_framework_simplejwt.tokens import AccessToken
 
 from courses.models import Course, Membership, Environment, Assignment
 from build_rules.models import Rule
-from submissions.models import Submission
+from submissions.models import Submission, UploadSession
+from submissions.api.throttles import QUEUE_DEPTH_CACHE_KEY
 
 from courses.tests.test_models import SAMPLE_ENVIRONMENT
 
@@ -71,8 +82,8 @@ class SubmissionAPIViewTest(APITestCase):
         response = self.client.get(self.submission_list_url)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['user'], self.teacher.id)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['user'], self.teacher.id)
 
     def test_can_get_submission(self):
         self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.teacher_access_token}")
@@ -131,6 +142,415 @@ class UserSubmissionsAPIViewTest(APITestCase):
 
         user_submissions_list_url = reverse("courses:submissions:user-list", args=(self.course.id, user.id))
         response = self.client.get(user_submissions_list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['status'], Submission.PERFORMED)
+
+
+class UploadSessionAPIViewTest(APITestCase):
+
+    def setUp(self):
+        self.student = User.objects.create_user("student@mail.com")
+        self.course = Course.objects.create(title="Test course", description="Test course description")
+        self.environment = Environment.objects.create(course=self.course, **SAMPLE_ENVIRONMENT)
+        self.course.add_member(self.student, Membership.STUDENT)
+        self.assignment = self.course.add_assignment(title="Test assignment", environment=self.environment,
+                                                     description="Test assignment description")
+        self.content = b'print("Hello, world!")\n'
+
+        access_token = AccessToken.for_user(self.student)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access_token}")
+
+        response = self.client.post(reverse('courses:submissions:upload-list', args=(self.course.id,)), {
+            'assignment': self.assignment.id,
+            'filename': 'main.py',
+            'size': len(self.content),
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.upload_id = response.data['id']
+        self.upload_url = reverse('courses:submissions:upload-detail', args=(self.course.id, self.upload_id))
+        self.commit_url = reverse('courses:submissions:upload-commit', args=(self.course.id, self.upload_id))
+
+    def _put(self, start, end):
+        return self.client.put(self.upload_url, self.content[start:end + 1],
+                               content_type='application/octet-stream',
+                               HTTP_CONTENT_RANGE=f"bytes {start}-{end}/{len(self.content)}")
+
+    def test_can_resume_upload(self):
+        response = self._put(0, 9)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['offset'], 10)
+
+        response = self.client.get(self.upload_url)
+        self.assertEqual(response.data['offset'], 10)
+
+        response = self._put(10, len(self.content) - 1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['offset'], len(self.content))
+
+        upload = UploadSession.objects.get(pk=self.upload_id)
+        with open(upload.staged_path, 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_cant_upload_chunk_beyond_offset(self):
+        response = self._put(10, 15)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['offset'], 0)
+
+    def test_cant_commit_incomplete_upload(self):
+        self._put(0, 9)
+        response = self.client.post(self.commit_url, {'sha256': hashlib.sha256(self.content).hexdigest()})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_cant_commit_with_wrong_checksum(self):
+        self._put(0, len(self.content) - 1)
+        response = self.client.post(self.commit_url, {'sha256': hashlib.sha256(b'other').hexdigest()})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Submission.objects.count(), 0)
+
+    def test_cant_access_upload_of_another_user(self):
+        user = User.objects.create_user("another@mail.com")
+        self.course.add_member(user, Membership.STUDENT)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+
+        response = self.client.get(self.upload_url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SubmissionPaginationAPIViewTest(APITestCase):
+
+    def setUp(self):
+        self.teacher = User.objects.create_user("teacher@mail.com")
+        self.student = User.objects.create_user("student@mail.com")
+        self.course = Course.objects.create(title="Test course", description="Test course description")
+        self.environment = Environment.objects.create(course=self.course, **SAMPLE_ENVIRONMENT)
+        self.course.add_member(self.teacher, Membership.TEACHER)
+        self.course.add_member(self.student, Membership.STUDENT)
+        self.assignment = self.course.add_assignment(title="Test assignment", environment=self.environment,
+                                                     description="Test assignment description")
+        self.submissions = [
+            Submission.objects.create(assignment=self.assignment, user=self.student, status=status_,
+                                      repo_url='github.com/terdenan/test-educi', branch='master')
+            for status_ in (Submission.PERFORMED, Submission.FAILED, Submission.PERFORMED)
+        ]
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.student)}")
+        self.user_list_url = reverse('courses:submissions:user-list', args=(self.course.id, self.student.id))
+
+    def test_can_page_through_submissions(self):
+        response = self.client.get(self.user_list_url, {'limit': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([entry['id'] for entry in response.data['results']],
+                         [self.submissions[2].id, self.submissions[1].id])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([entry['id'] for entry in response.data['results']], [self.submissions[0].id])
+        self.assertIsNone(response.data['next'])
+
+    def test_can_filter_submissions_by_status(self):
+        response = self.client.get(self.user_list_url, {'limit': 10, 'status': Submission.FAILED})
+        self.assertEqual([entry['id'] for entry in response.data['results']], [self.submissions[1].id])
+
+    def test_pages_submissions_by_default(self):
+        response = self.client.get(self.user_list_url)
+        self.assertEqual(len(response.data['results']), 3)
+
+        response = self.client.get(self.user_list_url, {'limit': 1000})
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertIsNone(response.data['next'])
+
+    def test_cant_filter_by_invalid_value(self):
+        response = self.client.get(self.user_list_url, {'status': 'failed'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_teacher_can_page_through_latest_submissions(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.teacher)}")
+        response = self.client.get(reverse('courses:submissions:list', args=(self.course.id,)), {'limit': 1})
+
+        self.assertEqual([entry['id'] for entry in response.data['results']], [self.submissions[2].id])
+        self.assertIsNone(response.data['next'])
+
+    def test_teacher_can_page_through_latest_submissions_of_course(self):
+        other = User.objects.create_user("other@mail.com")
+        self.course.add_member(other, Membership.STUDENT)
+        latest = Submission.objects.create(assignment=self.assignment, user=other,
+                                           repo_url='github.com/terdenan/test-educi', branch='master')
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.teacher)}")
+        response = self.client.get(reverse('courses:submissions:list', args=(self.course.id,)), {'limit': 1})
+        self.assertEqual([entry['id'] for entry in response.data['results']], [latest.id])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([entry['id'] for entry in response.data['results']], [self.submissions[2].id])
+        self.assertIsNone(response.data['next'])
+
+
+class SubmissionLogAPIViewTest(APITestCase):
+
+    def setUp(self):
+        self.student = User.objects.create_user("student@mail.com")
+        self.course = Course.objects.create(title="Test course", description="Test course description")
+        self.environment = Environment.objects.create(course=self.course, **SAMPLE_ENVIRONMENT)
+        self.course.add_member(self.student, Membership.STUDENT)
+        self.assignment = self.course.add_assignment(title="Test assignment", environment=self.environment,
+                                                     description="Test assignment description")
+        self.submission = Submission.objects.create(assignment=self.assignment, user=self.student,
+                                                    repo_url='github.com/terdenan/test-educi', branch='master',
+                                                    stdout="Hello, world!\n")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.student)}")
+
+    def _url(self, stream):
+        return reverse('courses:submissions:logs', args=(self.course.id, self.submission.id, stream))
+
+    def test_lists_dont_include_logs(self):
+        response = self.client.get(reverse('courses:submissions:user-list', args=(self.course.id, self.student.id)))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('stdout', response.data['results'][0])
+        self.assertEqual(response.data['results'][0]['assignment_title'], self.assignment.title)
+
+    def test_can_get_log(self):
+        response = self.client.get(self._url('stdout'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), b"Hello, world!\n")
+
+    def test_can_get_range_of_log(self):
+        response = self.client.get(self._url('stdout'), HTTP_RANGE='bytes=7-')
+
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(response.streaming_content), b"world!\n")
+
+    def test_cant_get_unknown_log(self):
+        response = self.client.get(self._url('environ'))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SubmissionEventsAPIViewTest(APITestCase):
+
+    def setUp(self):
+        self.student = User.objects.create_user("student@mail.com")
+        self.other_student = User.objects.create_user("other_student@mail.com")
+        self.course = Course.objects.create(title="Test course", description="Test course description")
+        self.environment = Environment.objects.create(course=self.course, **SAMPLE_ENVIRONMENT)
+        self.course.add_member(self.student, Membership.STUDENT)
+        self.course.add_member(self.other_student, Membership.STUDENT)
+        self.assignment = self.course.add_assignment(title="Test assignment", environment=self.environment,
+                                                     description="Test assignment description")
+        self.submission = Submission.objects.create(assignment=self.assignment, user=self.student,
+                                                    repo_url='github.com/terdenan/test-educi', branch='master',
+                                                    status=Submission.PERFORMED)
+        self.url = reverse('courses:submissions:events', args=(self.course.id, self.submission.id))
+
+    def test_streams_status_of_finished_submission(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.student)}")
+        response = self.client.get(self.url, HTTP_ACCEPT='text/event-stream')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn(f'event: status\ndata: {{"status": {Submission.PERFORMED}}}\n\n', content)
+
+    def test_others_cant_stream_events(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.other_student)}")
+        response = self.client.get(self.url, HTTP_ACCEPT='text/event-stream')
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class SubmissionStatusesAPIViewTest(APITestCase):
+
+    def setUp(self):
+        self.teacher = User.objects.create_user("teacher@mail.com")
+        self.student = User.objects.create_user("student@mail.com")
+        self.other_student = User.objects.create_user("other_student@mail.com")
+        self.course = Course.objects.create(title="Test course", description="Test course description")
+        self.environment = Environment.objects.create(course=self.course, **SAMPLE_ENVIRONMENT)
+        self.course.add_member(self.teacher, Membership.TEACHER)
+        self.course.add_member(self.student, Membership.STUDENT)
+        self.course.add_member(self.other_student, Membership.STUDENT)
+        self.assignment = self.course.add_assignment(title="Test assignment", environment=self.environment,
+                                                     description="Test assignment description")
+        self.submission = Submission.objects.create(assignment=self.assignment, user=self.student,
+                                                    repo_url='github.com/terdenan/test-educi', branch='master',
+                                                    stdout="Hello!")
+        self.other_submission = Submission.objects.create(assignment=self.assignment, user=self.other_student,
+                                                          repo_url='github.com/terdenan/test-educi',
+                                                          branch='master')
+        self.url = reverse('courses:submissions:statuses', args=(self.course.id,))
+
+    def _get(self, user, **kwargs):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+        return self.client.get(self.url, **kwargs)
+
+    def test_returns_own_submissions_by_default(self):
+        response = self._get(self.student)
+
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['status'], Submission.PERFORMED)
+        self.assertEqual(response.data[0]['id'], self.submission.id)
+        self.assertEqual(response.data[0]['log_size'], len("Hello!"))
+
+    def test_staff_can_get_any_submissions(self):
+        ids = f'{self.submission.id},{self.other_submission.id}'
+        response = self._get(self.teacher, data={'ids': ids})
+
+        self.assertEqual([item['id'] for item in response.data], [self.submission.id, self.other_submission.id])
+
+    def test_student_gets_only_own_submissions(self):
+        ids = f'{self.submission.id},{self.other_submission.id}'
+        response = self._get(self.student, data={'ids': ids})
+
+        self.assertEqual([item['id'] for item in response.data], [self.submission.id])
+
+    def test_unchanged_batch_isnt_sent_again(self):
+        etag = self._get(self.student)['ETag']
+
+        response = self._get(self.student, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.submission.status = Submission.PERFORMED
+        self.submission.save()
+        response = self._get(self.student, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_statuses_take_one_query_besides_authentication(self):
+        with self.assertNumQueries(3):
+            # Requester, role and the batch itself
+            self._get(self.teacher, data={'ids': f'{self.submission.id}'})
+
+    def test_non_members_cant_get_statuses(self):
+        stranger = User.objects.create_user("stranger@mail.com")
+        response = self._get(stranger)
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class GradebookAPIViewTest(APITestCase):
+
+    def setUp(self):
+        self.teacher = User.objects.create_user("teacher@mail.com")
+        self.student = User.objects.create_user("student@mail.com")
+        self.course = Course.objects.create(title="Test course", description="Test course description")
+        self.environment = Environment.objects.create(course=self.course, **SAMPLE_ENVIRONMENT)
+        self.course.add_member(self.teacher, Membership.TEACHER)
+        self.course.add_member(self.student, Membership.STUDENT)
+        self.assignment = self.course.add_assignment(title="Test assignment", environment=self.environment,
+                                                     description="Test assignment description")
+        for _ in range(3):
+            self.latest = Submission.objects.create(assignment=self.assignment, user=self.student,
+                                                    repo_url='github.com/terdenan/test-educi', branch='master')
+        self.url = reverse('courses:submissions:gradebook', args=(self.course.id,))
+
+    def _get(self, user, **kwargs):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+        return self.client.get(self.url, **kwargs)
+
+    def test_teacher_can_get_gradebook(self):
+        response = self._get(self.teacher)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        gradebook = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(gradebook), 1)
+        self.assertEqual(gradebook[0]['user_email'], self.student.email)
+        self.assertEqual(gradebook[0]['submission'], self.latest.id)
+        self.assertEqual(gradebook[0]['attempts'], 3)
+
+    def test_teacher_can_get_gradebook_as_csv(self):
+        response = self._get(self.teacher, data={'type': 'csv'})
+
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][1], self.student.email)
+
+    def test_student_cant_get_gradebook(self):
+        response = self._get(self.student)
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class SubmissionExportAPIViewTest(APITestCase):
+
+    def setUp(self):
+        self.teacher = User.objects.create_user("teacher@mail.com")
+        self.student = User.objects.create_user("student@mail.com")
+        self.course = Course.objects.create(title="Test course", description="Test course description")
+        self.environment = Environment.objects.create(course=self.course, **SAMPLE_ENVIRONMENT)
+        self.course.add_member(self.teacher, Membership.TEACHER)
+        self.course.add_member(self.student, Membership.STUDENT)
+        self.assignment = self.course.add_assignment(title="Test assignment", environment=self.environment,
+                                                     description="Test assignment description")
+        self.submission = Submission.objects.create(assignment=self.assignment, user=self.student,
+                                                    repo_url='github.com/terdenan/test-educi', branch='master',
+                                                    stdout="Build output\n" * 100, stderr="Error")
+        self.store_dir = os.path.join(settings.MEDIA_ROOT, self.submission.store_dir)
+        os.makedirs(os.path.join(self.store_dir, 'src'))
+        with open(os.path.join(self.store_dir, 'src', 'main.py'), 'w') as f:
+            f.write("print('Hello')\n")
+        self.url = reverse('courses:submissions:export', args=(self.course.id,))
+
+    def tearDown(self):
+        shutil.rmtree(self.store_dir, ignore_errors=True)
+
+    def _get(self, user, **kwargs):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+        return self.client.get(self.url, **kwargs)
+
+    def test_teacher_can_export_submissions(self):
+        response = self._get(self.teacher)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        archive = tarfile.open(fileobj=io.BytesIO(b''.join(response.streaming_content)))
+        prefix = f'submission_{self.submission.id}'
+        self.assertEqual(archive.extractfile(f'{prefix}/stdout.log').read(), b"Build output\n" * 100)
+        self.assertEqual(archive.extractfile(f'{prefix}/stderr.log').read(), b"Error")
+        self.assertEqual(archive.extractfile(f'{prefix}/sources/src/main.py').read(), b"print('Hello')\n")
+        metadata = json.loads(archive.extractfile(f'{prefix}/submission.json').read())
+        self.assertEqual(metadata['user_email'], self.student.email)
+
+    def test_can_export_submissions_of_assignment(self):
+        other = self.course.add_assignment(title="Other assignment", environment=self.environment,
+                                           description="Other assignment description")
+        response = self._get(self.teacher, data={'assignment': other.id})
+
+        archive = tarfile.open(fileobj=io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(archive.getnames(), [])
+
+    def test_student_cant_export_submissions(self):
+        response = self._get(self.student)
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class SubmissionThrottlingAPIViewTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user("student@mail.com")
+        self.course = Course.objects.create(title="Test course", description="Test course description")
+        self.course.add_member(self.student, Membership.STUDENT)
+        self.url = reverse('courses:submissions:list', args=(self.course.id,))
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.student)}")
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_limits_submissions_rate_of_user(self):
+        for _ in range(10):
+            response = self.client.post(self.url, {})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(self.url, {})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+
+    def test_rejects_submissions_while_queue_is_full(self):
+        cache.set(QUEUE_DEPTH_CACHE_KEY, 11)
+
+        with self.settings(SUBMISSION_QUEUE_MAX_DEPTH=10, SUBMISSION_QUEUE_RETRY_AFTER=30):
+            response = self.client.post(self.url, {})
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '30')
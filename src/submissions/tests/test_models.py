@@ -1,8 +1,17 @@
-from django.test import TestCase
+import io
+import os
+import json
+import shutil
+
+from django.db import transaction, DatabaseError
+from django.test import TestCase, TransactionTestCase
+from django.core.management import call_command
 from django.contrib.auth import get_user_model
 
 from courses.models import Course, Environment
-from submissions.models import Submission
+from submissions import events
+from submissions.models import Submission, LatestSubmission, UploadSession
+from submissions.tasks import perform_submission
 
 from courses.tests.test_models import SAMPLE_ENVIRONMENT
 
@@ -28,3 +37,225 @@ class TestSubmissionModel(TestCase):
         inserted_submission = Submission.objects.first()
 
         self.assertEqual(inserted_submission, self.submission)
+
+    def test_stores_logs_compressed(self):
+        output = "Step 1/3 : RUN make\n" * 1000
+        self.submission.stdout = output
+        self.submission.save()
+
+        submission = Submission.objects.get(pk=self.submission.pk)
+        self.assertEqual(submission.stdout, output)
+        self.assertEqual(submission.stdout_size, len(output))
+        self.assertLess(len(submission.stdout_compressed), len(output) // 10)
+        self.assertEqual(submission.legacy_stdout, "")
+
+    def test_can_read_log_from_position(self):
+        output = ''.join(f"line {i}\n" for i in range(100000))
+        self.submission.stdout = output
+        self.submission.save()
+
+        submission = Submission.objects.get(pk=self.submission.pk)
+        fileobj, size = submission.open_log('stdout')
+        fileobj.seek(size - 12)
+        self.assertEqual(fileobj.read(), output[-12:].encode())
+        fileobj.seek(0)
+        self.assertEqual(fileobj.read(10), output[:10].encode())
+
+    def test_can_compress_legacy_logs(self):
+        Submission.objects.filter(pk=self.submission.pk).update(legacy_stdout="Legacy output", legacy_stderr="")
+
+        call_command('compress_submission_logs', batch_size=1, stdout=io.StringIO())
+
+        submission = Submission.objects.get(pk=self.submission.pk)
+        self.assertEqual(submission.legacy_stdout, "")
+        self.assertEqual(submission.stdout, "Legacy output")
+        self.assertIsNone(submission.stderr_compressed)
+
+
+class TestLatestSubmissionModel(TransactionTestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('test@mail.com')
+        self.course = Course.objects.create(title="Test course", description="Test course description")
+        self.environment = Environment.objects.create(course=self.course, **SAMPLE_ENVIRONMENT)
+        self.assignment = self.course.add_assignment(title='Test assignment', environment=self.environment,
+                                                     description='Test assignment description')
+
+    def _submit(self):
+        return Submission.objects.create(assignment=self.assignment, user=self.user,
+                                         repo_url='testurl.com', branch='test')
+
+    def test_tracks_latest_submission(self):
+        first = self._submit()
+        latest = self._submit()
+
+        entry = LatestSubmission.objects.get(assignment=self.assignment, user=self.user)
+        self.assertEqual(entry.submission, latest)
+        self.assertEqual(entry.course, self.course)
+        self.assertEqual(entry.attempts, 2)
+        self.assertEqual(entry.first_datetime, first.datetime)
+
+    def test_falls_back_to_previous_submission_on_delete(self):
+        previous = self._submit()
+        self._submit().delete()
+
+        entry = LatestSubmission.objects.get(assignment=self.assignment, user=self.user)
+        self.assertEqual(entry.submission, previous)
+        self.assertEqual(entry.attempts, 1)
+
+        previous.delete()
+        self.assertEqual(LatestSubmission.objects.count(), 0)
+
+    def test_falls_back_to_previous_submission_on_queryset_delete(self):
+        previous = self._submit()
+        latest = self._submit()
+
+        Submission.objects.filter(pk=latest.pk).delete()
+
+        entry = LatestSubmission.objects.get(assignment=self.assignment, user=self.user)
+        self.assertEqual(entry.submission, previous)
+        self.assertEqual(entry.attempts, 1)
+
+    def test_refreshes_each_pair_once_on_bulk_delete(self):
+        previous = self._submit()
+        latest = [self._submit() for _ in range(3)]
+
+        # Delete itself, course of the sources and a single refresh of the pair
+        with self.assertNumQueries(10):
+            Submission.objects.filter(pk__in=[submission.pk for submission in latest]).delete()
+
+        entry = LatestSubmission.objects.get(assignment=self.assignment, user=self.user)
+        self.assertEqual(entry.submission, previous)
+        self.assertEqual(entry.attempts, 1)
+
+    def test_can_rebuild_projection(self):
+        first = self._submit()
+        latest = self._submit()
+        LatestSubmission.objects.all().delete()
+
+        call_command('rebuild_latest_submissions', stdout=io.StringIO())
+
+        entry = LatestSubmission.objects.get()
+        self.assertEqual(entry.submission, latest)
+        self.assertEqual(entry.submission_datetime, latest.datetime)
+        self.assertEqual(entry.attempts, 2)
+        self.assertEqual(entry.first_datetime, first.datetime)
+
+
+class TestSupersededSubmissions(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('test@mail.com')
+        self.course = Course.objects.create(title="Test course", description="Test course description")
+        self.environment = Environment.objects.create(course=self.course, **SAMPLE_ENVIRONMENT)
+        self.assignment = self.course.add_assignment(title='Test assignment', environment=self.environment,
+                                                     description='Test assignment description')
+
+    def _submit(self, **kwargs):
+        return Submission.objects.create(assignment=self.assignment, user=self.user,
+                                         repo_url='testurl.com', branch='test', **kwargs)
+
+    def test_keeps_previous_submissions_by_default(self):
+        previous = self._submit()
+        self._submit()
+
+        previous.refresh_from_db()
+        self.assertEqual(previous.status, Submission.PROCESSING)
+
+    def test_supersedes_unfinished_submissions(self):
+        self.assignment.cancel_superseded = True
+        self.assignment.save()
+        performed = self._submit(status=Submission.PERFORMED)
+        previous = self._submit()
+        latest = self._submit()
+
+        statuses = dict(Submission.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[performed.id], Submission.PERFORMED)
+        self.assertEqual(statuses[previous.id], Submission.SUPERSEDED)
+        self.assertEqual(statuses[latest.id], Submission.PROCESSING)
+
+    def test_superseded_submission_isnt_performed(self):
+        submission = self._submit(status=Submission.SUPERSEDED)
+
+        perform_submission(submission.id)
+
+        submission.refresh_from_db()
+        self.assertEqual(submission.status, Submission.SUPERSEDED)
+
+    def test_finishing_keeps_concurrent_superseded_status(self):
+        submission = self._submit()
+        Submission.objects.filter(pk=submission.pk).update(status=Submission.SUPERSEDED)
+
+        submission.finish(Submission.PERFORMED, "Output")
+
+        submission.refresh_from_db()
+        self.assertEqual(submission.status, Submission.SUPERSEDED)
+        self.assertEqual(submission.stdout, "Output")
+
+
+class TestUploadSession(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('test@mail.com')
+        self.course = Course.objects.create(title="Test course", description="Test course description")
+        self.environment = Environment.objects.create(course=self.course, **SAMPLE_ENVIRONMENT)
+        self.assignment = self.course.add_assignment(title='Test assignment', environment=self.environment,
+                                                     description='Test assignment description')
+
+    def test_session_is_committed_once(self):
+        upload = UploadSession.objects.create(assignment=self.assignment, user=self.user, filename='main.py', size=0)
+        self.addCleanup(shutil.rmtree, os.path.dirname(upload.staged_path), ignore_errors=True)
+        concurrent = UploadSession.objects.get(pk=upload.pk)
+
+        submission = upload.commit('f00d')
+
+        self.assertIsNone(concurrent.commit('f00d'))
+        self.assertEqual(list(Submission.objects.all()), [submission])
+        self.assertFalse(UploadSession.objects.exists())
+
+
+class FakeEventsClient:
+
+    def __init__(self):
+        self.published = []
+
+    def publish(self, channel, message):
+        self.published.append((channel, json.loads(message)))
+
+
+class TestStatusEvents(TransactionTestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('test@mail.com')
+        self.course = Course.objects.create(title="Test course", description="Test course description")
+        self.environment = Environment.objects.create(course=self.course, **SAMPLE_ENVIRONMENT)
+        self.assignment = self.course.add_assignment(title='Test assignment', environment=self.environment,
+                                                     description='Test assignment description')
+        self.events_client = events._client = FakeEventsClient()
+        self.settings_override = self.settings(SUBMISSION_EVENTS_URL='redis://events')
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        events._client = None
+
+    def test_publishes_committed_status_changes_only(self):
+        submission = Submission.objects.create(assignment=self.assignment, user=self.user,
+                                               repo_url='testurl.com', branch='test')
+        submission.save()
+
+        with self.assertRaises(DatabaseError):
+            with transaction.atomic():
+                submission = Submission.objects.get(pk=submission.pk)
+                submission.status = Submission.FAILED
+                submission.save()
+                raise DatabaseError
+        self.assertEqual(self.events_client.published, [])
+
+        submission = Submission.objects.get(pk=submission.pk)
+        submission.status = Submission.PERFORMED
+        submission.save()
+        submission.save()
+
+        message = {'event': 'status', 'data': {'status': Submission.PERFORMED}}
+        self.assertEqual(self.events_client.published, [(events.channel(submission.id), message)])
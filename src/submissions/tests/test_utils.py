@@ -0,0 +1,328 @@
+import io
+import os
+import hashlib
+import shutil
+import tarfile
+import tempfile
+import zipfile
+
+from django.conf import settings
+from django.db import transaction, DatabaseError
+from django.test import TestCase, TransactionTestCase, RequestFactory
+from django.core.cache.backends.filebased import FileBasedCache
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from courses.models import Course, Environment
+from submissions.models import Submission
+from courses.utils.plans import Step, CacheSpec
+from submissions.utils.archives import ArchiveError, SafeExtractor
+from submissions.utils.artifacts import (
+    open_artifact, store_artifact, execute_cached, get_cache_stats, reset_cache_stats
+)
+from submissions.utils.blobs import BlobStore, hash_file
+from submissions.utils.downloader import UploadedSourcesStrategy
+
+from courses.tests.test_models import SAMPLE_ENVIRONMENT
+
+User = get_user_model()
+
+
+class TestBlobStore(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = BlobStore(os.path.join(self.root, 'blobs'))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _write(self, name, content):
+        path = os.path.join(self.root, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def test_stores_identical_content_once(self):
+        first = self.store.ingest(self._write('first.py', b'print(1)'))
+        second = self.store.ingest(self._write('second.py', b'print(1)'))
+
+        self.assertEqual(first, second)
+        self.assertTrue(self.store.exists(first))
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'second.py')))
+
+    def test_collects_unreferenced_blobs(self):
+        used = self.store.ingest(self._write('used.py', b'used'))
+        unused = self.store.ingest(self._write('unused.py', b'unused'))
+        self.store.link(used, os.path.join(self.root, 'submission', 'used.py'))
+
+        self.assertEqual(self.store.references(used), 1)
+        self.assertEqual(self.store.collect_garbage(), len(b'unused'))
+        self.assertTrue(self.store.exists(used))
+        self.assertFalse(self.store.exists(unused))
+
+
+def make_tar(members):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as tf:
+        for name, content in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tf.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+def make_zip(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, mode='w') as zf:
+        for name, content in members.items():
+            zf.writestr(name, content)
+    return buffer.getvalue()
+
+
+class TestSafeExtractor(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.destination = os.path.join(self.root, 'sources')
+        os.makedirs(self.destination)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _archive(self, name, content):
+        path = os.path.join(self.root, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def test_extracts_tar(self):
+        path = self._archive('sources.tar.gz', make_tar({'src/main.py': b'print(1)'}))
+        SafeExtractor(self.destination).extract(path)
+
+        with open(os.path.join(self.destination, 'src', 'main.py'), 'rb') as f:
+            self.assertEqual(f.read(), b'print(1)')
+
+    def test_extracts_zip(self):
+        path = self._archive('sources.zip', make_zip({'main.py': b'print(1)'}))
+        SafeExtractor(self.destination).extract(path)
+
+        self.assertTrue(os.path.isfile(os.path.join(self.destination, 'main.py')))
+
+    def test_rejects_path_traversal(self):
+        path = self._archive('sources.tar.gz', make_tar({'../evil.py': b'print(1)'}))
+
+        self.assertRaises(ArchiveError, SafeExtractor(self.destination).extract, path)
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'evil.py')))
+
+    def test_limits_entries_count(self):
+        path = self._archive('sources.zip', make_zip({f'{i}.py': b'' for i in range(3)}))
+
+        self.assertRaises(ArchiveError, SafeExtractor(self.destination, max_entries=2).extract, path)
+
+    def test_limits_unpacked_size(self):
+        path = self._archive('sources.tar.gz', make_tar({'big.txt': b'0' * 1024}))
+
+        self.assertRaises(ArchiveError, SafeExtractor(self.destination, max_size=512).extract, path)
+
+
+class TestUploadedSourcesStrategy(TransactionTestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('test@mail.com')
+        self.course = Course.objects.create(title="Test course", description="Test course description")
+        self.environment = Environment.objects.create(course=self.course, **SAMPLE_ENVIRONMENT)
+        self.assignment = self.course.add_assignment(title='Test assignment', environment=self.environment,
+                                                     description='Test assignment description')
+
+    def tearDown(self):
+        for submission in Submission.objects.all():
+            shutil.rmtree(os.path.join(settings.MEDIA_ROOT, submission.store_dir), ignore_errors=True)
+
+    def _submit(self, content, filename='main.py'):
+        source = SimpleUploadedFile(filename, content)
+        submission = Submission.objects.create(assignment=self.assignment, user=self.user, source=source)
+        UploadedSourcesStrategy(submission).process_sources()
+        return submission
+
+    def test_links_identical_uploads_to_the_same_blob(self):
+        first = self._submit(b'print("Hello, world!")')
+        second = self._submit(b'print("Hello, world!")')
+
+        first_stat = os.stat(first.source.path)
+        second_stat = os.stat(second.source.path)
+        self.assertEqual(first.source_digest, second.source_digest)
+        self.assertEqual(first.source_digest, hash_file(first.source.path))
+        self.assertEqual(first_stat.st_ino, second_stat.st_ino)
+
+    def test_linking_replaces_existing_file(self):
+        submission = self._submit(b'print("Hello again!")')
+        store = BlobStore()
+
+        # Retried task links the same blob once more
+        store.link(submission.source_digest, submission.source.path)
+
+        self.assertEqual(store.references(submission.source_digest), 1)
+        self.assertEqual(os.listdir(os.path.dirname(submission.source.path)), ['main.py'])
+
+    def test_small_uploads_are_hashed_in_memory(self):
+        content = b'print("Small upload")'
+        self.assertLess(len(content), settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+
+        request = RequestFactory().post('/', {'source': SimpleUploadedFile('main.py', content)})
+
+        self.assertEqual(request.FILES['source'].sha256, hashlib.sha256(content).hexdigest())
+
+    def test_deleting_submission_drops_reference(self):
+        submission = self._submit(b'print("Bye, world!")')
+        digest = submission.source_digest
+        store_dir = os.path.join(settings.MEDIA_ROOT, submission.store_dir)
+        store = BlobStore()
+
+        self.assertEqual(store.references(digest), 1)
+        submission.delete()
+        self.assertEqual(store.references(digest), 0)
+        self.assertFalse(os.path.isdir(store_dir))
+
+    def test_cascade_delete_drops_reference(self):
+        submission = self._submit(b'print("Cascade")')
+        store_dir = os.path.join(settings.MEDIA_ROOT, submission.store_dir)
+
+        self.assignment.delete()
+
+        self.assertEqual(BlobStore().references(submission.source_digest), 0)
+        self.assertFalse(os.path.isdir(store_dir))
+
+    def test_sources_are_kept_when_deletion_is_rolled_back(self):
+        submission = self._submit(b'print("Rollback")')
+        store_dir = os.path.join(settings.MEDIA_ROOT, submission.store_dir)
+
+        with self.assertRaises(DatabaseError):
+            with transaction.atomic():
+                Submission.objects.get(pk=submission.pk).delete()
+                raise DatabaseError
+
+        self.assertTrue(Submission.objects.filter(pk=submission.pk).exists())
+        self.assertEqual(BlobStore().references(submission.source_digest), 1)
+        self.assertTrue(os.path.isdir(store_dir))
+
+    def test_extracts_uploaded_archive(self):
+        submission = self._submit(make_zip({'main.py': b'print(1)'}), filename='sources.zip')
+        store_dir = os.path.join(settings.MEDIA_ROOT, submission.store_dir)
+
+        self.assertEqual(os.listdir(store_dir), ['main.py'])
+
+
+class FakeContainer:
+    """Container which runs nothing and succeeds at everything"""
+
+    def __init__(self, image_id='sha256:f00d', outputs_exist=False):
+        self.executed = []
+        self.notes = []
+        self._image_id = image_id
+        self._outputs_exist = outputs_exist
+
+    def image_id(self):
+        return self._image_id
+
+    def exec(self, *options, command='', command_args=None):
+        self.executed.append(command_args[-1])
+        return 0
+
+    def exec_quiet(self, *options, command='', command_args=None, stdin=None, stdout=None):
+        if command == 'bash':
+            return 0, b'f00d  -\n0\n' if self._outputs_exist else b'f00d  -\n1\n'
+        if command_args[0] == '-cf':
+            stdout.write(b'outputs')
+        return 0, None
+
+    def note(self, text):
+        self.notes.append(text)
+
+
+class TestArtifactCache(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.settings_override = self.settings(ARTIFACT_CACHE_DIR=self.root, ARTIFACT_CACHE_MAX_SIZE=1024)
+        self.settings_override.enable()
+        reset_cache_stats()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.root)
+
+    def _store(self, key, content):
+        store_artifact(key, lambda f: f.write(content) > 0)
+
+    def test_restores_outputs_instead_of_executing(self):
+        step = Step("' pip install -r requirements.txt'", False, CacheSpec(('requirements.txt',), ('venv',)))
+        container = FakeContainer()
+
+        self.assertEqual(execute_cached(container, step, 1), 0)
+        self.assertEqual(execute_cached(container, step, 1), 0)
+
+        self.assertEqual(container.executed, [step.command])
+        self.assertEqual(len(container.notes), 1)
+        stats = get_cache_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['artifacts']), (1, 1, 1))
+
+    def test_rebuilt_image_misses_cache(self):
+        step = Step("' pip install -r requirements.txt'", False, CacheSpec(('requirements.txt',), ('venv',)))
+        execute_cached(FakeContainer(), step, 1)
+
+        # Image is rebuilt under the same tag
+        container = FakeContainer(image_id='sha256:beef')
+        self.assertEqual(execute_cached(container, step, 1), 0)
+
+        self.assertEqual(container.executed, [step.command])
+        self.assertEqual(get_cache_stats()['misses'], 2)
+
+    def test_other_assignment_misses_cache(self):
+        step = Step("' pip install -r requirements.txt'", False, CacheSpec(('requirements.txt',), ('venv',)))
+        execute_cached(FakeContainer(), step, 1)
+
+        container = FakeContainer()
+        self.assertEqual(execute_cached(container, step, 2), 0)
+
+        self.assertEqual(container.executed, [step.command])
+        self.assertEqual(get_cache_stats()['misses'], 2)
+
+    def test_outputs_existing_before_run_arent_stored(self):
+        step = Step("' pip install -r requirements.txt'", False, CacheSpec(('requirements.txt',), ('venv',)))
+        # Student uploaded files at the output path
+        execute_cached(FakeContainer(outputs_exist=True), step, 1)
+
+        container = FakeContainer()
+        self.assertEqual(execute_cached(container, step, 1), 0)
+
+        self.assertEqual(container.executed, [step.command])
+        self.assertEqual(get_cache_stats()['hits'], 0)
+
+    def test_counters_are_shared_with_other_processes(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        shared_cache = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+        with self.settings(CACHES={**settings.CACHES, 'stats': shared_cache}, ARTIFACT_CACHE_STATS_CACHE='stats'):
+            self.assertIsNone(open_artifact('missing'))
+
+        # Cache of the process running the command
+        self.assertEqual(FileBasedCache(location, {}).get('artifact_cache_stats:misses'), 1)
+
+    def test_evicts_least_recently_used_artifacts(self):
+        self._store('first', b'x' * 400)
+        self._store('second', b'x' * 400)
+        os.utime(os.path.join(self.root, 'second.tar'), (0, 0))
+        open_artifact('first').close()
+
+        self._store('third', b'x' * 400)
+
+        self.assertIsNone(open_artifact('second'))
+        with open_artifact('first') as artifact:
+            self.assertEqual(artifact.read(), b'x' * 400)
+        self.assertEqual(get_cache_stats()['size'], 800)
+
+    def test_failed_artifacts_are_not_stored(self):
+        store_artifact('failed', lambda f: False)
+
+        self.assertEqual(os.listdir(self.root), [])
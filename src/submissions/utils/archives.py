@@ -0,0 +1,96 @@
+import os
+import stat
+import tarfile
+import zipfile
+import zlib
+
+from django.conf import settings
+
+CHUNK_SIZE = 64 * 1024
+
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def is_archive(path):
+    return path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+class SafeExtractor:
+    """
+    Extracts tar and zip archives member by member without trusting them:
+    total unpacked size and entries count are limited, members escaping
+    the destination directory are rejected, links and special files are skipped.
+    """
+
+    def __init__(self, destination, max_size=None, max_entries=None):
+        self.destination = os.path.abspath(destination)
+        self.max_size = max_size or settings.SOURCES_ARCHIVE_MAX_SIZE
+        self.max_entries = max_entries or settings.SOURCES_ARCHIVE_MAX_ENTRIES
+        self._size = 0
+        self._entries = 0
+
+    def extract(self, path):
+        try:
+            if zipfile.is_zipfile(path):
+                self._extract_zip(path)
+            elif tarfile.is_tarfile(path):
+                self._extract_tar(path)
+            else:
+                raise ArchiveError(f"{os.path.basename(path)} is not a supported archive")
+        except (tarfile.TarError, zipfile.BadZipFile, zlib.error, EOFError) as e:
+            raise ArchiveError(f"Corrupted archive {os.path.basename(path)}: {e}")
+
+    def _extract_tar(self, path):
+        # Stream mode reads the archive sequentially without seeking back
+        with tarfile.open(path, mode='r|*') as tf:
+            for member in tf:
+                target = self._target(member.name)
+                if member.isdir():
+                    os.makedirs(target, exist_ok=True)
+                elif member.isfile():
+                    self._write(tf.extractfile(member), target, executable=member.mode & stat.S_IXUSR)
+
+    def _extract_zip(self, path):
+        with zipfile.ZipFile(path) as zf:
+            for info in zf.infolist():
+                target = self._target(info.filename)
+                mode = info.external_attr >> 16
+                if info.is_dir():
+                    os.makedirs(target, exist_ok=True)
+                elif not stat.S_ISLNK(mode):
+                    with zf.open(info) as src:
+                        self._write(src, target, executable=mode & stat.S_IXUSR)
+
+    def _target(self, name):
+        self._entries += 1
+        if self._entries > self.max_entries:
+            raise ArchiveError(f"Archive contains more than {self.max_entries} entries")
+
+        target = os.path.abspath(os.path.join(self.destination, name))
+        if target != self.destination and not target.startswith(self.destination + os.sep):
+            raise ArchiveError(f"Archive member {name} points outside of the destination")
+        return target
+
+    def _write(self, src, target, executable=False):
+        if target == self.destination:
+            raise ArchiveError("Archive contains a file without a name")
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Files in the destination may be hard links to shared blobs,
+        # so they are replaced instead of being written through
+        if os.path.lexists(target):
+            os.remove(target)
+        with open(target, 'wb') as dst:
+            # Real unpacked size is counted since headers can't be trusted
+            for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                self._size += len(chunk)
+                if self._size > self.max_size:
+                    raise ArchiveError(f"Archive unpacks to more than {self.max_size} bytes")
+                dst.write(chunk)
+
+        if executable:
+            os.chmod(target, 0o755)
@@ -0,0 +1,147 @@
+import os
+import uuid
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+STATS_KEYS = ('hits', 'misses')
+
+
+def _cache():
+    return caches[settings.ARTIFACT_CACHE_STATS_CACHE]
+
+
+def _count(name):
+    key = f'artifact_cache_stats:{name}'
+    # Counter must exist before incrementing, `add` doesn't reset an existing one
+    _cache().add(key, 0, None)
+    _cache().incr(key)
+
+
+def get_artifact_path(key):
+    return os.path.join(settings.ARTIFACT_CACHE_DIR, f'{key}.tar')
+
+
+def make_key(assignment_id, image_id, command, outputs, inputs_digest):
+    # Artifacts aren't shared across assignments, whose courses have their own teachers
+    parts = (str(assignment_id), image_id, command, ' '.join(outputs), inputs_digest)
+    return hashlib.sha256('\0'.join(parts).encode()).hexdigest()
+
+
+def open_artifact(key):
+    """
+    Returns opened tar with outputs cached under the key or None. Opened file stays
+    readable even when it's evicted meanwhile, access time is kept in mtime for LRU.
+    """
+    path = get_artifact_path(key)
+    try:
+        artifact = open(path, 'rb')
+    except FileNotFoundError:
+        _count('misses')
+        return None
+
+    os.utime(path)
+    _count('hits')
+    return artifact
+
+
+def store_artifact(key, write):
+    """Stores artifact written by `write(fileobj)` which returns whether it succeeded"""
+    os.makedirs(settings.ARTIFACT_CACHE_DIR, exist_ok=True)
+    path = get_artifact_path(key)
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            succeeded = write(f)
+        if succeeded:
+            os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    evict(settings.ARTIFACT_CACHE_MAX_SIZE)
+
+
+def evict(max_size):
+    """Removes least recently used artifacts until their total size fits into max_size"""
+    entries = []
+    for entry in os.scandir(settings.ARTIFACT_CACHE_DIR):
+        if entry.name.endswith('.tar') and entry.is_file():
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_size:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Evicted by another worker sharing the directory
+            pass
+        total -= size
+
+
+def get_cache_stats():
+    stats = _cache().get_many([f'artifact_cache_stats:{name}' for name in STATS_KEYS])
+    hits, misses = (stats.get(f'artifact_cache_stats:{name}', 0) for name in STATS_KEYS)
+    lookups = hits + misses
+
+    size = count = 0
+    if os.path.isdir(settings.ARTIFACT_CACHE_DIR):
+        for entry in os.scandir(settings.ARTIFACT_CACHE_DIR):
+            if entry.name.endswith('.tar') and entry.is_file():
+                size += entry.stat().st_size
+                count += 1
+
+    return {'hits': hits, 'misses': misses, 'hit_ratio': hits / lookups if lookups else None,
+            'artifacts': count, 'size': size}
+
+
+def reset_cache_stats():
+    _cache().delete_many([f'artifact_cache_stats:{name}' for name in STATS_KEYS])
+
+
+def execute_cached(container, step, assignment_id):
+    """
+    Restores outputs of the cacheable step when its inputs are unchanged and executes
+    the step otherwise, storing outputs of its successful run. Outputs are stored only
+    when none of them existed before the run, so files uploaded by a student at output
+    paths don't end up in artifacts restored for others. Returns exit code.
+    """
+    # Outputs depend on the image, which may be rebuilt under the same tag
+    image_id = container.image_id()
+    if image_id is None:
+        return container.exec(command='bash', command_args=['-c', step.command])
+
+    paths = ' '.join(step.cache.inputs)
+    outputs = ' '.join(step.cache.outputs)
+    # Prints digest of the inputs followed by 1 when none of the outputs exist yet
+    hash_command = f"'set -o pipefail; cd /src && absent=1 && " \
+                   f"for p in {outputs}; do if [ -e \"$p\" ] || [ -L \"$p\" ]; then absent=0; fi; done && " \
+                   f"find {paths} -type f -print0 | sort -z | xargs -0 -r sha256sum | sha256sum && echo $absent'"
+    ret_code, output = container.exec_quiet(command='bash', command_args=['-c', hash_command])
+    if ret_code != 0:
+        # Inputs can't be hashed, e.g. some of them are missing, so nothing is cached
+        return container.exec(command='bash', command_args=['-c', step.command])
+
+    fields = output.decode().split()
+    digest, outputs_absent = fields[0], fields[-1] == '1'
+    key = make_key(assignment_id, image_id, step.command, step.cache.outputs, digest)
+    artifact = open_artifact(key)
+    if artifact is not None:
+        with artifact:
+            ret_code, _ = container.exec_quiet('-i', command='tar',
+                                               command_args=['-xf', '-', '--no-same-owner', '-C', '/src'],
+                                               stdin=artifact)
+        if ret_code == 0:
+            container.note(f"Restored from cache: {outputs}\n")
+            return 0
+
+    ret_code = container.exec(command='bash', command_args=['-c', step.command])
+    if ret_code == 0 and outputs_absent:
+        store_artifact(key, lambda f: container.exec_quiet(
+            command='tar', command_args=['-cf', '-', '-C', '/src', *step.cache.outputs], stdout=f
+        )[0] == 0)
+    return ret_code
@@ -0,0 +1,101 @@
+import os
+import uuid
+import hashlib
+
+from django.conf import settings
+
+CHUNK_SIZE = 64 * 1024
+
+
+def hash_file(path):
+    """Returns sha256 hex digest of a file, reading it in chunks"""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class BlobStore:
+    """
+    Content-addressable storage for uploaded sources.
+
+    Every unique file is kept once under `<MEDIA_ROOT>/blobs/ab/cdef...` and
+    submission directories hold hard links to it. The hard link count of a
+    blob is its reference counter: a blob with a single link is referenced
+    by nobody and can be collected.
+    """
+
+    def __init__(self, root=None):
+        self._root = root
+
+    @property
+    def root(self):
+        # MEDIA_ROOT is resolved lazily so tests can override it
+        return self._root or os.path.join(settings.MEDIA_ROOT, 'blobs')
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:])
+
+    def exists(self, digest):
+        return os.path.isfile(self.path(digest))
+
+    def ingest(self, path, digest=None):
+        """
+        Moves file by given path into the store and returns its digest.
+        If the same content is already stored, the file is simply removed.
+        """
+        if digest is None:
+            digest = hash_file(path)
+
+        blob_path = self.path(digest)
+        if os.path.isfile(blob_path):
+            os.remove(path)
+            self._prune(os.path.dirname(path))
+        else:
+            os.renames(path, blob_path)
+
+        return digest
+
+    def link(self, digest, destination):
+        """Makes destination a hard link to the stored blob, replacing existing file"""
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        # Retried tasks find the destination linked already, so it's replaced atomically
+        tmp_path = f'{destination}.{uuid.uuid4().hex}.link'
+        os.link(self.path(digest), tmp_path)
+        try:
+            os.replace(tmp_path, destination)
+        finally:
+            # Renaming is a no-op when destination is a link to the same blob already
+            if os.path.lexists(tmp_path):
+                os.remove(tmp_path)
+
+    def references(self, digest):
+        """Number of submission files referencing the blob"""
+        return os.stat(self.path(digest)).st_nlink - 1
+
+    def collect_garbage(self):
+        """Removes blobs which are not referenced anymore. Returns freed bytes count."""
+        freed = 0
+        if not os.path.isdir(self.root):
+            return freed
+
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                blob_path = os.path.join(dirpath, filename)
+                stat = os.stat(blob_path)
+                if stat.st_nlink == 1:
+                    os.remove(blob_path)
+                    freed += stat.st_size
+            if dirpath != self.root:
+                self._prune(dirpath)
+
+        return freed
+
+    @staticmethod
+    def _prune(dirname):
+        """Removes directory if it was left empty"""
+        try:
+            os.rmdir(dirname)
+        except OSError:
+            pass
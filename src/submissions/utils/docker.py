@@ -1,6 +1,8 @@
 import io
 import subprocess
 
+CHUNK_SIZE = 4096
+
 
 class DockerException(Exception):
     pass
@@ -8,11 +10,14 @@ class DockerException(Exception):
 
 class DockerContainer:
 
-    def __init__(self, image, name):
+    def __init__(self, image, name, on_output=None):
         self.image = image
         self.name = name
+        self._on_output = on_output
         self._output = io.BytesIO()
         self._running = False
+        self._created = False
+        self._image_id = None
 
     @property
     def output(self):
@@ -29,6 +34,7 @@ class DockerContainer:
         p = subprocess.run(cmd, shell=True, capture_output=True)
         if p.returncode == 0:
             self._running = True
+            self._created = True
         return p.returncode
 
     def exec(self, *options, command='', command_args=None):
@@ -39,10 +45,42 @@ class DockerContainer:
         command_args = command_args or []
         command_args = ' '.join(command_args)
         cmd = f"docker exec {options} {self.name} {command} {command_args}"
-        p = subprocess.run(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-        self._output.write(p.stdout)
+        with subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT) as p:
+            # Output is passed on as soon as it appears, so it can be watched live
+            for chunk in iter(lambda: p.stdout.read1(CHUNK_SIZE), b''):
+                self._output.write(chunk)
+                if self._on_output is not None:
+                    self._on_output(chunk)
         return p.returncode
 
+    def exec_quiet(self, *options, command='', command_args=None, stdin=None, stdout=subprocess.PIPE):
+        """Executes command without adding its output to the log, returns exit code and captured stdout"""
+        if not self._running:
+            raise DockerException(f"Container {self.name} is not running")
+
+        options = ' '.join(options)
+        command_args = command_args or []
+        command_args = ' '.join(command_args)
+        cmd = f"docker exec {options} {self.name} {command} {command_args}"
+        p = subprocess.run(cmd, shell=True, stdin=stdin, stdout=stdout, stderr=subprocess.DEVNULL)
+        return p.returncode, p.stdout
+
+    def image_id(self):
+        """ID of the image the container was run from or None, unlike tags it changes when the image is rebuilt"""
+        if self._image_id is None:
+            cmd = f"docker inspect --format='{{{{.Image}}}}' {self.name}"
+            p = subprocess.run(cmd, shell=True, capture_output=True)
+            if p.returncode == 0:
+                self._image_id = p.stdout.decode().strip()
+        return self._image_id
+
+    def note(self, text):
+        """Adds a message of the grader to the log"""
+        chunk = text.encode()
+        self._output.write(chunk)
+        if self._on_output is not None:
+            self._on_output(chunk)
+
     def stop(self):
         cmd = f"docker stop {self.name}"
         p = subprocess.run(cmd, shell=True, capture_output=True)
@@ -62,8 +100,10 @@ class DockerContainer:
         return self
 
     def __exit__(self, *exc):
-        if not self._running:
+        if not self._created:
             return
 
-        self.stop()
+        # Container may be stopped already, e.g. when the run was aborted
+        if self._running:
+            self.stop()
         self.rm()
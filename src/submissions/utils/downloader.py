@@ -1,5 +1,4 @@
 import os
-import tarfile
 import shutil
 import re
 from abc import ABC, abstractmethod
@@ -7,6 +6,9 @@ from abc import ABC, abstractmethod
 import requests
 from django.conf import settings
 
+from submissions.utils.blobs import BlobStore
+from submissions.utils.archives import ArchiveError, SafeExtractor, is_archive
+
 
 class Strategy(ABC):
 
@@ -36,11 +38,7 @@ class Strategy(ABC):
         elif not os.path.isabs(extract_to):
             raise Exception("Specified extract_to argument must be absolute")
 
-        with tarfile.open(path) as tf:
-            # TODO: consider TarFile.extractall warning
-            #  https://docs.python.org/3/library/tarfile.html#tarfile.TarFile.extractall
-            tf.extractall(extract_to)
-
+        SafeExtractor(extract_to).extract(path)
         os.remove(path)
 
 
@@ -49,18 +47,46 @@ class UploadedSourcesStrategy(Strategy):
     def process_sources(self):
         self.move_from_tmp()
 
-        # TODO: extract if needed
+        source_path = self._submission.source.path
+        if is_archive(source_path):
+            self.extract_sources(source_path)
+
+    def extract_sources(self, path):
+        """
+        Unpacks uploaded archive once into submission's directory, so that
+        containers get plain files. Partially extracted files are removed on failure.
+        """
+        try:
+            self._extract(path)
+        except ArchiveError:
+            store_dir = os.path.dirname(path)
+            for entry in os.listdir(store_dir):
+                entry_path = os.path.join(store_dir, entry)
+                if entry_path == path:
+                    continue
+                if os.path.isdir(entry_path):
+                    shutil.rmtree(entry_path)
+                else:
+                    os.remove(entry_path)
+            raise
 
     def move_from_tmp(self):
+        """
+        Moves uploaded file into the blob store and links it into submission's
+        directory, so identical uploads are stored only once.
+        """
         initial_path = self._submission.source.path
 
         filename = os.path.basename(self._submission.source.name)
         media_path = self._media_path(filename)
         new_path = os.path.join(settings.MEDIA_ROOT, media_path)
 
-        self._submission.source.name = media_path
-        os.renames(initial_path, new_path)
+        store = BlobStore()
+        digest = store.ingest(initial_path, self._submission.source_digest or None)
+        store.link(digest, new_path)
 
+        self._submission.source.name = media_path
+        self._submission.source_digest = digest
         self._submission.save()
 
 
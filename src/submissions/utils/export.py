@@ -0,0 +1,97 @@
+import os
+import json
+import tarfile
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+CHUNK_SIZE = 64 * 1024
+BATCH_SIZE = 100
+
+
+def tar_member(name, size, chunks, mtime):
+    """Yields tar header, content and padding of a member, content size must be known in advance"""
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = mtime
+    info.mode = 0o644
+    yield info.tobuf(format=tarfile.PAX_FORMAT)
+
+    written = 0
+    for chunk in chunks:
+        chunk = chunk[:size - written]
+        written += len(chunk)
+        yield chunk
+        if written == size:
+            break
+    # Content that shrank meanwhile is padded, so offsets of the following members hold
+    yield tarfile.NUL * (size - written)
+
+    remainder = size % tarfile.BLOCKSIZE
+    if remainder:
+        yield tarfile.NUL * (tarfile.BLOCKSIZE - remainder)
+
+
+def read_chunks(fileobj):
+    with fileobj:
+        for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b''):
+            yield chunk
+
+
+def submission_members(submission):
+    prefix = f'submission_{submission.id}'
+    mtime = int(submission.datetime.timestamp())
+
+    metadata = json.dumps({
+        'id': submission.id,
+        'assignment': submission.assignment_id,
+        'assignment_title': submission.assignment.title,
+        'user': submission.user_id,
+        'user_email': submission.user.email,
+        'repo_url': submission.repo_url,
+        'branch': submission.branch,
+        'datetime': submission.datetime,
+        'reviewer': submission.reviewer_id,
+        'status': submission.status,
+    }, cls=DjangoJSONEncoder).encode()
+    yield from tar_member(f'{prefix}/submission.json', len(metadata), [metadata], mtime)
+
+    for stream in submission.LOG_STREAMS:
+        fileobj, size = submission.open_log(stream)
+        yield from tar_member(f'{prefix}/{stream}.log', size, read_chunks(fileobj), mtime)
+
+    store_dir = os.path.join(settings.MEDIA_ROOT, submission.store_dir)
+    for root, dirs, files in os.walk(store_dir):
+        dirs.sort()
+        for filename in sorted(files):
+            path = os.path.join(root, filename)
+            if os.path.islink(path):
+                continue
+            name = os.path.relpath(path, store_dir)
+            try:
+                fileobj = open(path, 'rb')
+            except FileNotFoundError:
+                continue
+            stat = os.fstat(fileobj.fileno())
+            yield from tar_member(f'{prefix}/sources/{name}', stat.st_size, read_chunks(fileobj), int(stat.st_mtime))
+
+
+def export_submissions(submissions):
+    """
+    Yields tar archive with metadata, logs and sources of the submissions. Rows are read
+    by a server-side cursor and files in chunks, so memory use doesn't depend on the amount.
+    """
+    submissions = submissions.select_related('assignment__course', 'user').order_by('id')
+
+    size = 0
+    for submission in submissions.iterator(chunk_size=BATCH_SIZE):
+        for block in submission_members(submission):
+            size += len(block)
+            yield block
+
+    end = tarfile.NUL * (2 * tarfile.BLOCKSIZE)
+    size += len(end)
+    remainder = size % tarfile.RECORDSIZE
+    if remainder:
+        end += tarfile.NUL * (tarfile.RECORDSIZE - remainder)
+    yield end
@@ -0,0 +1,68 @@
+import io
+import zlib
+
+CHUNK_SIZE = 64 * 1024
+COMPRESSION_LEVEL = 6
+
+
+def compress(text):
+    """Returns (compressed bytes, size of uncompressed utf-8 content)"""
+    data = text.encode()
+    return zlib.compress(data, COMPRESSION_LEVEL), len(data)
+
+
+def decompress(data):
+    return zlib.decompress(bytes(data)).decode()
+
+
+class CompressedLogReader(io.RawIOBase):
+    """
+    File-like object decompressing the log while it's read, so the whole
+    output isn't kept in memory. Seeking backwards restarts decompression.
+    """
+
+    def __init__(self, data):
+        super().__init__()
+        self._data = memoryview(data)
+        self._reset()
+
+    def _reset(self):
+        self._decompressor = zlib.decompressobj()
+        self._consumed = 0
+        self._buffer = b''
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("Only absolute positions are supported")
+        if offset < self._position:
+            self._reset()
+        while self._position < offset:
+            if not self.read(min(CHUNK_SIZE, offset - self._position)):
+                break
+        return self._position
+
+    def readinto(self, buffer):
+        size = len(buffer)
+        while len(self._buffer) < size and not self._decompressor.eof and self._consumed < len(self._data):
+            chunk = self._data[self._consumed:self._consumed + CHUNK_SIZE]
+            self._consumed += len(chunk)
+            self._buffer += self._decompressor.decompress(chunk, size)
+            # Leftover of the chunk is kept by the decompressor until more output is requested
+            self._consumed -= len(self._decompressor.unconsumed_tail)
+        if len(self._buffer) < size and self._decompressor.unconsumed_tail == b'' and not self._decompressor.eof:
+            self._buffer += self._decompressor.flush()
+
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
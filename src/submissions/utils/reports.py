@@ -0,0 +1,46 @@
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+BATCH_SIZE = 2000
+
+
+class Echo:
+    """Pseudo-buffer returning written value, so csv rows can be yielded one by one"""
+
+    def write(self, value):
+        return value
+
+
+def stream_json(columns, rows):
+    """Yields JSON array of objects built from rows without keeping them in memory"""
+    encoder = DjangoJSONEncoder()
+    yield '['
+    for i, row in enumerate(rows):
+        item = encoder.encode(dict(zip(columns, row)))
+        yield item if i == 0 else ',' + item
+    yield ']'
+
+
+def stream_csv(columns, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+GRADEBOOK_COLUMNS = ('user', 'user_email', 'assignment', 'assignment_title', 'submission', 'status',
+                     'attempts', 'first_datetime', 'last_datetime', 'reviewer', 'reviewer_email')
+
+
+def gradebook_rows(course_id):
+    """Rows of the course gradebook read by a single query from the latest submissions projection"""
+    from submissions.models import LatestSubmission
+
+    return LatestSubmission.objects.\
+        filter(course__id=course_id).\
+        order_by('user_id', 'assignment_id').\
+        values_list('user_id', 'user__email', 'assignment_id', 'assignment__title', 'submission_id',
+                    'submission__status', 'attempts', 'first_datetime', 'submission__datetime',
+                    'submission__reviewer_id', 'submission__reviewer__email').\
+        iterator(chunk_size=BATCH_SIZE)
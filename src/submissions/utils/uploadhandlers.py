@@ -0,0 +1,36 @@
+import hashlib
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+
+class HashingUploadMixin:
+    """
+    Computes sha256 of an uploaded file while its chunks stream in
+    and exposes it as `sha256` attribute of the resulting file.
+    """
+
+    def new_file(self, *args, **kwargs):
+        # Memory handler stops other handlers with an exception from `new_file`
+        self._hasher = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        passed = super().receive_data_chunk(raw_data, start)
+        # Chunk is consumed by this handler only if it isn't passed further
+        if passed is None:
+            self._hasher.update(raw_data)
+        return passed
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self._hasher.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadMixin, TemporaryFileUploadHandler):
+    pass
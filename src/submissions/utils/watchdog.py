@@ -0,0 +1,33 @@
+import threading
+
+from django.db import connection
+
+
+class Watchdog(threading.Thread):
+    """
+    Checks `condition` every `interval` seconds in background and calls
+    `action` once it's met. Checks are stopped by `stop` or after the action.
+    """
+
+    def __init__(self, condition, action, interval):
+        super().__init__(daemon=True)
+        self.condition = condition
+        self.action = action
+        self.interval = interval
+        self.triggered = False
+        self._stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self._stopped.wait(self.interval):
+                if self.condition():
+                    self.triggered = True
+                    self.action()
+                    return
+        finally:
+            # Thread has its own database connection which isn't closed by Django
+            connection.close()
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
@@ -1,10 +1,12 @@
 from django.urls import path
 
-from .views import RegistrationAPI, UserDetailView
+from .views import RegistrationAPI, UserDetailView, UserProvisionView, ActivationView
 
 app_name = 'users'
 urlpatterns = [
     path('detail/', UserDetailView.as_view(), name='detail'),
     path('register/', RegistrationAPI.as_view(), name='register'),
+    path('provision/', UserProvisionView.as_view(), name='provision'),
+    path('activate/', ActivationView.as_view(), name='activate'),
 ]
 
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import identify_hasher
 import django.contrib.auth.password_validation as validators
 from django.core import exceptions
 
@@ -13,6 +14,43 @@ class UserSerializer(serializers.ModelSerializer):
         extra_kwargs = {'password': {'write_only': True}}
 
 
+def _validate_password(password):
+    errors = {}
+    try:
+        validators.validate_password(password=password)
+    except exceptions.ValidationError as e:
+        errors['messages'] = list(e.messages)
+    if errors:
+        raise serializers.ValidationError(errors)
+    return password
+
+
+class ProvisionUserSerializer(serializers.Serializer):
+    email = serializers.EmailField()
+    password_hash = serializers.CharField(required=False, allow_blank=True)
+
+    def validate_email(self, value):
+        return User.objects.normalize_email(value)
+
+    def validate_password_hash(self, value):
+        # Hash is stored as is, so it has to be produced by one of PASSWORD_HASHERS
+        if value:
+            try:
+                identify_hasher(value)
+            except ValueError:
+                raise serializers.ValidationError("Unknown password hash format")
+        return value
+
+
+class ActivationSerializer(serializers.Serializer):
+    uid = serializers.CharField()
+    token = serializers.CharField()
+    password = serializers.CharField(write_only=True)
+
+    def validate_password(self, password):
+        return _validate_password(password)
+
+
 class RegistrationSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -20,14 +58,7 @@ class RegistrationSerializer(serializers.ModelSerializer):
         extra_kwargs = {'password': {'write_only': True}}
 
     def validate_password(self, password):
-        errors = {}
-        try:
-            validators.validate_password(password=password)
-        except exceptions.ValidationError as e:
-            errors['messages'] = list(e.messages)
-        if errors:
-            raise serializers.ValidationError(errors)
-        return password
+        return _validate_password(password)
 
     def create(self, validated_data):
         return User.objects.create_user(**validated_data)
@@ -1,8 +1,14 @@
+from django.db import transaction
+from django.db.utils import IntegrityError
 from rest_framework import views, generics
 from rest_framework import permissions, status
 from rest_framework.response import Response
 
-from .serializers import RegistrationSerializer, UserSerializer
+from users.models import User
+from users.utils import make_activation_token, get_user_by_activation_token
+from .serializers import RegistrationSerializer, UserSerializer, ProvisionUserSerializer, ActivationSerializer
+
+PROVISION_MAX_ROWS = 5000
 
 
 class UserDetailView(views.APIView):
@@ -17,3 +23,67 @@ class UserDetailView(views.APIView):
 class RegistrationAPI(generics.CreateAPIView):
     serializer_class = RegistrationSerializer
     permission_classes = (permissions.AllowAny,)
+
+
+class UserProvisionView(views.APIView):
+    permission_classes = (permissions.IsAuthenticated, permissions.IsAdminUser)
+
+    def post(self, request):
+        """
+        Creates users listed as {email, password_hash} objects without hashing passwords.
+        Users given without a hash get activation tokens to set their passwords.
+        """
+        rows = request.data
+        if not isinstance(rows, list):
+            return Response({'error': 'List of users is expected'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > PROVISION_MAX_ROWS:
+            return Response({'error': f'At most {PROVISION_MAX_ROWS} users can be created at once'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        row_serializers = [ProvisionUserSerializer(data=row) for row in rows]
+        entries = [
+            (serializer.validated_data['email'], serializer.validated_data.get('password_hash', ''))
+            for serializer in row_serializers if serializer.is_valid()
+        ]
+        try:
+            with transaction.atomic():
+                created, taken = User.objects.provision(entries)
+        except IntegrityError:
+            return Response({'error': 'Some of the users were created meanwhile'}, status=status.HTTP_409_CONFLICT)
+
+        created = {user.email: user for user in created}
+        results = []
+        for row, serializer in zip(rows, row_serializers):
+            if serializer.errors:
+                results.append({'row': row, 'status': 'invalid', 'errors': serializer.errors})
+                continue
+
+            email = serializer.validated_data['email']
+            user = created.get(email, None)
+            if user is None:
+                results.append({'email': email, 'status': 'exists'})
+            elif user.has_usable_password():
+                results.append({'email': email, 'status': 'created', 'id': user.id})
+            else:
+                uid, token = make_activation_token(user)
+                results.append({'email': email, 'status': 'created', 'id': user.id, 'uid': uid, 'token': token})
+
+        return Response({'created': len(created), 'results': results}, status=status.HTTP_201_CREATED)
+
+
+class ActivationView(views.APIView):
+    permission_classes = (permissions.AllowAny,)
+
+    def post(self, request):
+        """Sets password of a provisioned user by the one-time activation token"""
+        serializer = ActivationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        user = get_user_by_activation_token(serializer.validated_data['uid'], serializer.validated_data['token'])
+        if user is None:
+            return Response({'error': 'Activation link is invalid or has been used already'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        user.set_password(serializer.validated_data['password'])
+        user.save(update_fields=['password'])
+        return Response(status=status.HTTP_204_NO_CONTENT)
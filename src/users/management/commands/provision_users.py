@@ -0,0 +1,62 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.core.exceptions import ValidationError
+from django.contrib.auth.hashers import identify_hasher
+
+from users.models import User, PROVISION_BATCH_SIZE
+from users.utils import make_activation_token
+
+
+class Command(BaseCommand):
+    help = "Creates users from CSV with `email[,password_hash]` rows without hashing passwords"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file with users")
+        parser.add_argument('--tokens', help="CSV file to write activation tokens of users without passwords to")
+        parser.add_argument('--batch-size', type=int, default=PROVISION_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        tokens_file = open(options['tokens'], 'w', newline='') if options['tokens'] else None
+        tokens = csv.writer(tokens_file) if tokens_file else None
+
+        created = taken = 0
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig') as f:
+                batch = []
+                for line, row in enumerate(csv.reader(f), start=1):
+                    if not row or row[0].strip().lower() == 'email':
+                        continue
+                    batch.append(self.parse_row(line, row))
+                    if len(batch) == batch_size:
+                        created, taken = self.provision(batch, tokens, created, taken)
+                        batch = []
+                created, taken = self.provision(batch, tokens, created, taken)
+        finally:
+            if tokens_file is not None:
+                tokens_file.close()
+
+        self.stdout.write(f"Created {created} users, {taken} emails are taken already")
+
+    @staticmethod
+    def parse_row(line, row):
+        email = User.objects.normalize_email(row[0].strip())
+        password_hash = row[1].strip() if len(row) > 1 else ''
+        try:
+            validate_email(email)
+            if password_hash:
+                identify_hasher(password_hash)
+        except (ValidationError, ValueError) as e:
+            raise CommandError(f"Line {line}: {e}")
+        return email, password_hash
+
+    @staticmethod
+    def provision(batch, tokens, created, taken):
+        users, taken_emails = User.objects.provision(batch)
+        if tokens is not None:
+            for user in users:
+                if not user.has_usable_password():
+                    tokens.writerow([user.email, *make_activation_token(user)])
+        return created + len(users), taken + len(taken_emails)
@@ -2,6 +2,8 @@ from django.db import models
 from django.contrib.auth.base_user import AbstractBaseUser, BaseUserManager
 from django.contrib.auth.models import PermissionsMixin
 
+PROVISION_BATCH_SIZE = 1000
+
 
 class UserManager(BaseUserManager):
     use_in_migrations = True
@@ -17,6 +19,33 @@ class UserManager(BaseUserManager):
         user.save(using=self._db)
         return user
 
+    def provision(self, entries, batch_size=PROVISION_BATCH_SIZE):
+        """
+        Creates users from (email, password hash) pairs in batches without hashing passwords.
+        Users without a hash get unusable password until they activate their accounts.
+        Returns created users and emails which are taken already.
+        """
+        created, taken = [], []
+        for start in range(0, len(entries), batch_size):
+            batch = entries[start:start + batch_size]
+            existing = set(self.filter(email__in=[email for email, _ in batch]).values_list('email', flat=True))
+
+            users = []
+            for email, password_hash in batch:
+                if email in existing:
+                    taken.append(email)
+                    continue
+                existing.add(email)
+
+                user = self.model(email=email)
+                if password_hash:
+                    user.password = password_hash
+                else:
+                    user.set_unusable_password()
+                users.append(user)
+            created.extend(self.bulk_create(users))
+        return created, taken
+
     def create_superuser(self, email, password=None):
         """
         Creates and saves a superuser with the given email and password.
@@ -34,6 +63,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     email = models.EmailField(db_index=True, unique=True)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # Incremented on every change of the user's course memberships
+    membership_version = models.PositiveIntegerField(default=0)
     USERNAME_FIELD = 'email'
 
     objects = UserManager()
@@ -140,3 +140,49 @@ class JWTAuthenticationAPITest(APITestCase):
         response = self.client.post(self.token_refresh_url, {'refresh': refresh})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertTrue('access' in response.data)
+
+
+class UserProvisionAPITest(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin@example.com', 'secret_word')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(AccessToken.for_user(self.admin)))
+        self.url = reverse('users:provision')
+
+    def test_admin_can_provision_users(self):
+        from django.contrib.auth.hashers import make_password
+
+        payload = [
+            {'email': 'with_password@example.com', 'password_hash': make_password('secret_word')},
+            {'email': 'without_password@example.com'},
+            {'email': 'admin@example.com'},
+            {'email': 'with_bad_hash@example.com', 'password_hash': 'plain text'},
+        ]
+        response = self.client.post(self.url, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([row['status'] for row in response.data['results']],
+                         ['created', 'created', 'exists', 'invalid'])
+        self.assertNotIn('token', response.data['results'][0])
+        self.assertIn('token', response.data['results'][1])
+
+    def test_provisioned_user_can_activate_account_once(self):
+        response = self.client.post(self.url, [{'email': 'user@example.com'}], format='json')
+        row = response.data['results'][0]
+        payload = {'uid': row['uid'], 'token': row['token'], 'password': 'new_secret_word'}
+
+        self.client.credentials()
+        response = self.client.post(reverse('users:activate'), payload)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertTrue(User.objects.get(email='user@example.com').check_password('new_secret_word'))
+
+        response = self.client.post(reverse('users:activate'), payload)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_users_cant_provision_users(self):
+        user = User.objects.create_user('user@example.com', 'secret_word')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(AccessToken.for_user(user)))
+
+        response = self.client.post(self.url, [], format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -1,5 +1,14 @@
+import os
+import csv
+import io
+import tempfile
+
 from django.test import TestCase
+from django.core.management import call_command
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+
+from users.utils import get_user_by_activation_token
 
 User = get_user_model()
 
@@ -19,3 +28,40 @@ class TestUserModel(TestCase):
         user = User.objects.create_user(email="test@example.com")
         self.assertEqual("test@example.com", str(user))
 
+
+class TestUserProvisioning(TestCase):
+
+    def test_provisions_users_in_batches(self):
+        User.objects.create_user(email="taken@example.com")
+        entries = [(f"user{i}@example.com", '') for i in range(5)] + [("taken@example.com", '')]
+
+        with self.assertNumQueries(6):
+            # Existing emails and insert for each of three batches
+            created, taken = User.objects.provision(entries, batch_size=2)
+
+        self.assertEqual(len(created), 5)
+        self.assertEqual(taken, ["taken@example.com"])
+        self.assertFalse(User.objects.get(email="user0@example.com").has_usable_password())
+
+    def test_keeps_password_hash(self):
+        password_hash = make_password("secret_word")
+
+        User.objects.provision([("user@example.com", password_hash)])
+
+        self.assertTrue(User.objects.get(email="user@example.com").check_password("secret_word"))
+
+    def test_command_writes_activation_tokens(self):
+        with tempfile.TemporaryDirectory() as directory:
+            users_path = os.path.join(directory, 'users.csv')
+            tokens_path = os.path.join(directory, 'tokens.csv')
+            with open(users_path, 'w') as f:
+                f.write("email,password_hash\nfirst@example.com\nsecond@example.com\n")
+
+            call_command('provision_users', users_path, tokens=tokens_path, batch_size=1, stdout=io.StringIO())
+
+            with open(tokens_path) as f:
+                rows = list(csv.reader(f))
+
+        self.assertEqual([row[0] for row in rows], ["first@example.com", "second@example.com"])
+        email, uid, token = rows[0]
+        self.assertEqual(get_user_by_activation_token(uid, token).email, email)
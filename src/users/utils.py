@@ -0,0 +1,25 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import default_token_generator
+from django.utils.encoding import force_bytes, force_text
+from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+
+
+def make_activation_token(user):
+    """
+    Returns (uid, token) pair which lets the user set a password once. The token is
+    bound to the current password hash, so it's invalidated when the password is set.
+    """
+    uid = urlsafe_base64_encode(force_bytes(user.pk)).decode()
+    return uid, default_token_generator.make_token(user)
+
+
+def get_user_by_activation_token(uid, token):
+    try:
+        user_id = force_text(urlsafe_base64_decode(uid))
+        user = get_user_model().objects.get(pk=user_id)
+    except (TypeError, ValueError, OverflowError, get_user_model().DoesNotExist):
+        return None
+
+    if not default_token_generator.check_token(user, token):
+        return None
+    return user